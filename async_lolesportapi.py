@@ -0,0 +1,638 @@
+import asyncio
+import logging
+
+from config import API_KEY, API_BASE_URL, LIVE_STATS_API, LANGUAGE_CODES
+
+from lolesportapi import LoLEsportApi
+from utils.lolesport_utilities import get_valid_date as window_date, check_correct_response
+from utils.json_backend import JsonResponse
+from utils.localized_data import merge_localized
+from utils.metrics import metrics
+from utils.rate_limiter import RequestScheduler
+from utils.response_cache import endpoint_name
+from Exceptions.lolesportsapi_exceptions import LoLEsportResponseError, LoLEsportStructureError
+import httpx
+
+log = logging.getLogger(__name__)
+
+
+class AsyncLoLEsportApi:
+    """Asyncio version of LoLEsportApi.
+
+    Every method has the same parameters and returns the same data as its LoLEsportApi counterpart, but it's a
+    coroutine. All the requests share a pooled HTTP client and no more than max_concurrency requests are in flight
+    at the same time, so independent calls can be awaited together with gather (or the gather_* batch methods).
+
+    Usage
+    -----
+        async with AsyncLoLEsportApi() as api:
+            leagues, teams = await api.gather(api.get_leagues(), api.get_teams(only_active=True))
+    """
+
+    def __init__(self, max_concurrency: int = 10, timeout: float = 30.0, scheduler: RequestScheduler = None,
+                 transport: httpx.AsyncBaseTransport = None):
+        # transport replaces the network, e.g. utils.transport.AsyncReplayTransport
+        self.client = httpx.AsyncClient(headers=API_KEY,
+                                        timeout=timeout,
+                                        transport=transport,
+                                        limits=httpx.Limits(max_connections=max_concurrency,
+                                                            max_keepalive_connections=max_concurrency))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.default_language = "en-US"
+        self.scheduler = scheduler if scheduler else RequestScheduler()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Close the pooled HTTP client."""
+        await self.client.aclose()
+
+    def set_default_language(self, language_code):
+        """Set a new default language
+
+             Parameters
+            ----------
+            language_code : str
+                The language code in which the information will be requested.
+            """
+        self.default_language = language_code
+
+    async def request(self, url: str, params: dict, live_stats_data: bool = False):
+        """Request an endpoint of the lolesport API, waiting for a free slot if max_concurrency requests are running.
+
+        Requests go through the rate limiter of the scheduler and are retried if they're throttled or fail.
+
+            Parameters
+            ----------
+            url : str
+                Full URL of the endpoint.
+            params : dict
+                Query parameters. Parameters with None value are not sent.
+            live_stats_data : bool
+                True for the live stats API (window/details), which doesn't wrap the result on a "data" key and
+                may answer 204 without content.
+
+            Returns
+             -------
+            dict
+                None if the response is not valid or there is no content.
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+
+        endpoint = endpoint_name(url)
+        async with self.semaphore:
+            with metrics.timer("api_request_seconds", endpoint=endpoint):
+                response = await self.scheduler.send_async(lambda: self.client.get(url, params=params),
+                                                           endpoint,
+                                                           retry_exceptions=(httpx.TransportError,))
+        metrics.increment("api_responses_total", endpoint=endpoint, status=response.status_code)
+        metrics.increment("api_response_bytes_total", len(response.content), endpoint=endpoint)
+        response = JsonResponse(response)
+
+        try:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(f"Response content: {response.text}")
+            check_correct_response(response, live_stats_data=live_stats_data)
+            if live_stats_data:
+                if response.status_code == 204:
+                    return None
+                return response.json()
+            return response.json()['data']
+        except (LoLEsportResponseError, LoLEsportStructureError):
+            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+
+    @staticmethod
+    async def gather(*coroutines) -> list:
+        """Run the given coroutines concurrently and return their results in the same order."""
+        return list(await asyncio.gather(*coroutines))
+
+    async def get_leagues(self, hl: str = None) -> dict:
+        """Retrieve leagues information (id, slug, name, region, image, priority, displayPriority).
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            Returns
+             -------
+            dict
+                """
+        if hl is None:
+            hl = self.default_language
+
+        return await self.request(API_BASE_URL + '/getLeagues', params={'hl': hl})
+
+    async def get_tournaments_for_league(self, hl: str = None, league_id: int = None) -> dict:
+        """Retrieve all splits/formats info for a given league (id, slug, startDate, endDate).
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            league_id: int (optional)
+                The league ID of which splits will be requested. If not provided all tournaments for all leagues
+                will be requested.
+
+            Returns
+             -------
+            dict
+            """
+        if hl is None:
+            hl = self.default_language
+
+        return await self.request(API_BASE_URL + '/getTournamentsForLeague',
+                                  params={'hl': hl, 'leagueId': league_id})
+
+    async def get_standings(self, tournament_id, hl: str = None):
+        """Retrieve the position splits/formats info for a given tournaments (id, slug, startDate, endDate).
+
+                Parameters
+                ----------
+                hl : str
+                    The language code in which the information will be requested.
+                    If not provided, take the default language value from the class.
+
+                tournament_id: int,int[] (Optional)
+                    The tournament(s) ID(s) of which splits will be requested. If not provided all tournaments for
+                     all leagues will be requested.
+
+                Returns
+                 -------
+                dict
+                """
+        if hl is None:
+            hl = self.default_language
+
+        return await self.request(API_BASE_URL + '/getStandings',
+                                  params={'hl': hl, 'tournamentId': tournament_id})
+
+    async def get_schedule(self, hl=None, league_id: int = None, pagetoken: str = None):
+        """Retrieve the schedule for a given league (blockName, league(name, slug), match(flags,id,strategy,teams),
+            startTime,state,type).
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            league_id:  int, optional
+                The league(s) ID(s) of which schedule will be requested. If not provided all schedule for all leagues
+                will be requested.
+
+            pagetoken: str, optional
+                Base 64 encoded string used to determine the next "page" of data to pull.
+
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
+
+        return await self.request(API_BASE_URL + '/getSchedule',
+                                  params={'hl': hl, 'leagueId': league_id, 'pageToken': pagetoken})
+
+    async def get_live(self, hl=None):
+        """Retrieve the current live matches
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
+
+        return await self.request(API_BASE_URL + '/getLive', params={'hl': hl})
+
+    async def get_completed_events(self, hl=None, tournament_id=None):
+        """Get completed games for a tournament or last 300 completed games of all tournaments.
+            DISCLAIMER ! Due to some inconsistency on the API, some tournaments don't return data.
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            tournament_id: int (optional)
+                The tournament(s) ID(s) of which splits will be requested. If not provided all tournaments for
+                 all leagues will be requested.
+
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
+
+        return await self.request(API_BASE_URL + '/getCompletedEvents',
+                                  params={'hl': hl, 'tournamentId': tournament_id})
+
+    async def get_event_details(self, match_id, hl=None):
+        """Get information about a match metadata like league, teams, vods and who stream the game.
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            match_id: int,str
+                The match(s) ID(s) of which information will be requested.
+
+
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
+
+        return await self.request(API_BASE_URL + '/getEventDetails', params={'hl': hl, 'id': match_id})
+
+    async def get_games(self, hl=None, match_id=None):
+        """Get information about a completed or unneeded match (id,number,state,vods).
+            If match_id is not provided all games will be requested
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            match_id: str, int (optional)
+                The match_id(s) ID(s) of which information will be requested. If not provided all games for
+                 all leagues will be requested.
+                 Can be a single int, a string or a list of ids separate by coma(s) as a single string.
+
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
+
+        return await self.request(API_BASE_URL + '/getGames', params={'hl': hl, 'id': match_id})
+
+    async def get_teams(self, hl=None, team_identifier=None, only_active: bool = False):
+        """Get information about a team a unneeded match (image,code,region,id,players,etc).
+            If team_identifier is not provided all teams will be requested.
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            team_identifier: str, id (optional)
+                The team slug or id of which information will be requested.
+                If team_slug is not provided all teams will be requested.
+
+            only_active: bool (optional)
+                True will return only teams with players and active
+
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
+
+        data = await self.request(API_BASE_URL + '/getTeams', params={'hl': hl, 'id': team_identifier})
+
+        if data and only_active:
+            teams = data.get("teams", None)
+            if teams:
+                return {"teams": [team for team in teams if team["status"] == "active"]}
+        return data
+
+    async def get_window(self, game_id, valid_datetime=None):
+        """Get information about a game, game stats (drakes, barons, etc) and players stats.
+
+        Parameters
+        ----------
+        game_id : str
+            The game id of which information will be requested.
+        valid_datetime:
+            A valid window time.
+
+        Returns
+         -------
+        dict
+    """
+        if not valid_datetime:
+            valid_datetime = window_date()
+
+        return await self.request(LIVE_STATS_API + f'/window/{game_id}',
+                                  params={'startingTime': valid_datetime},
+                                  live_stats_data=True)
+
+    async def get_details(self, game_id, participant_ids=None, valid_datetime: str = None):
+        """Get information about a player(s) on a game.
+            Parameters
+            ----------
+
+            game_id : str, int
+                The game id of which information will be requested.
+
+            participant_ids : str, int, int[] (Optional)
+                The participant(s) id of which information will be requested.
+                Must be an int, string or list of int
+
+            valid_datetime: str (optional)
+                A valid window time.
+            Returns
+            -------
+            dict
+        """
+        if type(participant_ids) == list:
+            participant_ids = "_".join(str(participant_id) for participant_id in participant_ids)
+        if not valid_datetime:
+            valid_datetime = window_date()
+
+        return await self.request(LIVE_STATS_API + f'/details/{game_id}',
+                                  params={'startingTime': valid_datetime, 'participantIds': participant_ids},
+                                  live_stats_data=True)
+
+    async def get_teams_for_tournament(self, tournament_id, hl=None, simplify_data_mode: bool = False):
+        """
+        Retrieve the list of participating teams in a tournament.
+        If simplify_data_mode is False, teams will be separated by the phase
+        in which they participate (quarterfinals, semifinals, etc.) and the result for that phase.
+
+        Parameters
+        ----------
+        hl : str
+            The language code in which the information will be requested.
+            If not provided, take the default language value from the class.
+
+        tournament_id: str,int,int[] (Optional)
+            The tournament(s) ID(s) of which splits will be requested.
+
+        simplify_data_mode : bool (Optional)
+            If true, the function only returns basic team information (id, name, slug, code, image)
+
+        Returns
+         -------
+        dict
+        """
+        standings = (await self.get_standings(tournament_id=tournament_id, hl=hl))['standings']
+
+        return LoLEsportApi.teams_from_standings(standings, simplify_data_mode=simplify_data_mode)
+
+    async def get_teams_for_tournaments(self, tournament_ids: list, hl=None, simplify_data_mode: bool = False):
+        """
+        Retrieve the participating teams of several tournaments with a single getStandings request.
+        See get_teams_for_tournament for the format of each tournament result.
+
+        Parameters
+        ----------
+        tournament_ids : list
+            The tournament IDs.
+
+        hl : str
+            The language code in which the information will be requested.
+            If not provided, take the default language value from the class.
+
+        simplify_data_mode : bool (Optional)
+            If true, the function only returns basic team information (id, name, slug, code, image)
+
+        Returns
+         -------
+        dict
+            Participating teams keyed by tournament id. None if the standings couldn't be retrieved.
+        """
+        standings = await self.get_standings(",".join([str(tournament_id) for tournament_id in tournament_ids]), hl=hl)
+        if not standings:
+            return None
+
+        return LoLEsportApi.teams_by_tournament_from_standings(tournament_ids, standings['standings'],
+                                                               simplify_data_mode=simplify_data_mode)
+
+    async def get_players(self, hl=None, team_identifier=None):
+        """Get players for a team (id,summonerName,firstName,lastName,image,rol).
+        If team_identifier is not provided all players will be requested, adding to the previous
+        information to which team(s) the player belong(s).
+
+            Parameters
+            ----------
+            hl : str
+              The language code in which the information will be requested.
+              If not provided, take the default language value from the class.
+
+            team_identifier: str, id (optional)
+              The team slug or id of which information will be requested.
+              If team_slug is not provided all teams will be requested.
+
+            Returns
+            -------
+            dict
+        """
+        data = await self.get_teams(hl=hl, team_identifier=team_identifier)
+
+        return LoLEsportApi.players_from_teams(data, keep_teams=not team_identifier)
+
+    async def get_live_games_info(self, only_ids: bool = False, hl=None):
+        """Get the games in progress of the live matches. See live_games_from_events for the format.
+
+            Parameters
+            ----------
+            only_ids : bool (optional)
+                If True only the ids of the in progress games are returned.
+
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            Returns
+             -------
+            dict
+        """
+        live_data = (await self.get_live(hl=hl))['schedule']['events']
+
+        return LoLEsportApi.live_games_from_events(live_data, only_ids=only_ids)
+
+    async def get_window_details(self, game_id: str):
+        """Get the window and the details of a game for the same (current) window time, ready to be merged with
+        get_merged_window_details_frames.
+
+            Parameters
+            ----------
+            game_id : str
+                The game id of which information will be requested.
+
+            Returns
+             -------
+            tuple
+                (window, details)
+        """
+        valid_datetime = window_date()
+
+        return tuple(await self.gather(self.get_window(game_id=game_id, valid_datetime=valid_datetime),
+                                       self.get_details(game_id=game_id, valid_datetime=valid_datetime)))
+
+    async def get_tournaments_league_related(self, hl=None, league_id=None, mode="ongoing"):
+        """Retrieve the tournaments of the leagues, each one with its league information.
+        See tournaments_from_leagues for the format.
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            league_id: int, str (optional)
+                The league(s) ID(s) of which tournaments will be requested, several as a single string separated by
+                comas. If not provided the tournaments of all leagues will be requested.
+
+            mode : str (optional)
+                "ongoing" keeps only tournaments in progress, "not_ended" keeps in progress and future tournaments.
+                Any other value keeps every tournament.
+
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
+
+        leagues = await self.get_leagues(hl=hl)
+        if not league_id:
+            league_id = ",".join([league['id'] for league in leagues['leagues']])
+        else:
+            # Keep only the requested leagues so they stay aligned with the tournaments response
+            league_ids = str(league_id).split(",")
+            leagues = {'leagues': [league for league in leagues['leagues'] if league['id'] in league_ids]}
+
+        tournaments = (await self.get_tournaments_for_league(hl=hl, league_id=league_id))['leagues']
+
+        return LoLEsportApi.tournaments_from_leagues(leagues, tournaments, mode=mode)
+
+    async def gather_standings(self, tournament_ids: list, hl: str = None) -> dict:
+        """Request the standings of every tournament concurrently.
+
+            Returns
+             -------
+            dict
+                Standings of each tournament keyed by tournament id.
+        """
+        results = await self.gather(*[self.get_standings(tournament_id, hl=hl) for tournament_id in tournament_ids])
+
+        return dict(zip(tournament_ids, results))
+
+    async def gather_teams_for_tournaments(self, tournament_ids: list, hl: str = None,
+                                          simplify_data_mode: bool = False) -> dict:
+        """Request the participating teams of every tournament concurrently.
+
+            Returns
+             -------
+            dict
+                Result of get_teams_for_tournament keyed by tournament id.
+        """
+        results = await self.gather(*[self.get_teams_for_tournament(tournament_id, hl=hl,
+                                                                    simplify_data_mode=simplify_data_mode)
+                                      for tournament_id in tournament_ids])
+
+        return dict(zip(tournament_ids, results))
+
+    async def gather_event_details(self, match_ids: list, hl: str = None) -> dict:
+        """Request the event details of every match concurrently.
+
+            Returns
+             -------
+            dict
+                Event details keyed by match id.
+        """
+        results = await self.gather(*[self.get_event_details(match_id, hl=hl) for match_id in match_ids])
+
+        return dict(zip(match_ids, results))
+
+    async def gather_windows(self, game_ids: list, valid_datetime: str = None) -> dict:
+        """Request the window of every game concurrently, all of them for the same window time.
+
+            Returns
+             -------
+            dict
+                Window of each game keyed by game id.
+        """
+        if not valid_datetime:
+            valid_datetime = window_date()
+
+        results = await self.gather(*[self.get_window(game_id, valid_datetime=valid_datetime)
+                                      for game_id in game_ids])
+
+        return dict(zip(game_ids, results))
+
+    async def gather_details(self, game_ids: list, valid_datetime: str = None) -> dict:
+        """Request the details of every game concurrently, all of them for the same window time.
+
+            Returns
+             -------
+            dict
+                Details of each game keyed by game id.
+        """
+        if not valid_datetime:
+            valid_datetime = window_date()
+
+        results = await self.gather(*[self.get_details(game_id, valid_datetime=valid_datetime)
+                                      for game_id in game_ids])
+
+        return dict(zip(game_ids, results))
+
+    async def gather_languages(self, getter, *args, languages: list = None, **kwargs) -> dict:
+        """Call an hl getter (e.g. self.get_leagues) for every language concurrently.
+
+            Parameters
+            ----------
+            getter : coroutine function
+                Method of this client with an hl parameter, called with args and kwargs.
+            languages : list
+                Language codes, config.LANGUAGE_CODES by default.
+
+            Returns
+             -------
+            dict
+                Response of each language keyed by language code. Languages whose request failed are left out.
+        """
+        if languages is None:
+            languages = LANGUAGE_CODES
+
+        results = await self.gather(*[getter(*args, hl=language, **kwargs) for language in languages])
+
+        responses = {language: result for language, result in zip(languages, results) if result is not None}
+        missing = [language for language in languages if language not in responses]
+        if missing:
+            log.warning(f"No response for languages {missing}")
+        return responses
+
+    async def get_localized(self, getter, *args, languages: list = None, **kwargs):
+        """Request every language concurrently (see gather_languages) and merge the responses with merge_localized,
+        so the values shared by all languages are stored once and only the translated ones by language.
+        Returns None if no language got a response.
+
+        Usage
+        -----
+            leagues = await api.get_localized(api.get_leagues)
+            schedule = await api.get_localized(api.get_schedule, league_id=league_id, languages=["en-US", "es-ES"])
+            spanish_leagues = localize(leagues, "es-ES")
+        """
+        responses = await self.gather_languages(getter, *args, languages=languages, **kwargs)
+        if not responses:
+            return None
+
+        return merge_localized(responses)
@@ -0,0 +1,145 @@
+import copy
+import datetime
+import io
+import logging
+
+import requests
+
+from config import root_dir
+from utils import json_backend
+from utils.response_cache import endpoint_name
+
+log = logging.getLogger(__name__)
+
+
+def load_fixture(name: str):
+    with open(f"{root_dir}/json_examples/{name}.json", 'rb') as f:
+        return json_backend.loads(f.read())
+
+
+def scaled_id(ext_id: str, copy_number: int) -> str:
+    """Id of the copy_number copy of an object. Ids are kept numeric, so they can be inserted as BIGINT."""
+    return ext_id if copy_number == 0 else f"{ext_id}{copy_number:03d}"
+
+
+def scale_teams(teams: list, factor: int) -> list:
+    """getTeams "teams" list with factor copies of every team (and its players), each one with different ids."""
+    scaled_teams = []
+    for copy_number in range(factor):
+        for team in teams:
+            team = copy.deepcopy(team)
+            team['id'] = scaled_id(team['id'], copy_number)
+            team['slug'] = f"{team['slug']}-{copy_number}" if copy_number else team['slug']
+            for player in team['players']:
+                player['id'] = scaled_id(player['id'], copy_number)
+            scaled_teams.append(team)
+
+    return scaled_teams
+
+
+def scale_frames(frames: list, factor: int) -> list:
+    """Frames repeated factor times, each repetition shifted after the previous one so timestamps keep growing."""
+    timestamps = [datetime.datetime.fromisoformat(frame['rfc460Timestamp'].replace("Z", "+00:00"))
+                  for frame in frames]
+    span = timestamps[-1] - timestamps[0] + datetime.timedelta(seconds=1)
+
+    scaled_frames = []
+    for copy_number in range(factor):
+        for frame, timestamp in zip(frames, timestamps):
+            frame = copy.deepcopy(frame)
+            frame['rfc460Timestamp'] = (timestamp + span * copy_number).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+            scaled_frames.append(frame)
+
+    return scaled_frames
+
+
+def standings_from_tournament_teams(tournament_teams: dict, factor: int = 1) -> list:
+    """Rebuild a getStandings "standings" list from a get_teams_for_tournament result, with factor copies of every
+    team. Bracket results are paired two by two as the matches of each phase."""
+    stages = []
+    for stage in tournament_teams['stages']:
+        teams = [{**team, 'id': scaled_id(team['id'], copy_number)}
+                 for copy_number in range(factor) for team in stage['teams']]
+
+        if stage['type'] == "groups":
+            sections = {}
+            for team in teams:
+                rankings = sections.setdefault(team['group'], {})
+                rankings.setdefault(team['position'], []).append(
+                    {key: value for key, value in team.items() if key not in ('group', 'position')})
+            stage_sections = [{'name': name, 'matches': [],
+                               'rankings': [{'ordinal': ordinal, 'teams': ranking_teams}
+                                            for ordinal, ranking_teams in rankings.items()]}
+                              for name, rankings in sections.items()]
+        else:
+            phases = {}
+            for team in teams:
+                team_data = {key: value for key, value in team.items() if key != 'results'}
+                for result in team['results']:
+                    phases.setdefault(result['phase'], []).append(
+                        {**team_data, 'result': {'outcome': result['outcome']} if result['outcome'] else None})
+            stage_sections = [{'name': name, 'rankings': [],
+                               'matches': [{'id': str(i), 'teams': phase_teams[i:i + 2]}
+                                           for i in range(0, len(phase_teams), 2)]}
+                              for name, phase_teams in phases.items()]
+
+        stages.append({'name': stage['name'], 'slug': stage['slug'], 'type': stage['type'],
+                       'sections': stage_sections})
+
+    return [{'stages': stages}]
+
+
+def live_events_from_event_details(event_details: dict, factor: int = 1) -> list:
+    """getLive "events" list with factor copies of an in progress getEventDetails event."""
+    event = event_details['event']
+    events = []
+    for copy_number in range(factor):
+        live_event = copy.deepcopy(event)
+        live_event['id'] = scaled_id(live_event['id'], copy_number)
+        live_event['state'] = "inProgress"
+        live_event['blockName'] = "Week 1"
+        live_event['league'] = {**live_event['league'], 'priority': 1, 'displayPriority': {'position': 1}}
+        events.append(live_event)
+
+    return events
+
+
+def leagues_from_teams(teams: list) -> list:
+    """getLeagues "leagues" list with the home leagues of the teams."""
+    leagues = {}
+    for team in teams:
+        if team['homeLeague']:
+            name = team['homeLeague']['name']
+            leagues.setdefault(name, {'id': str(9000 + len(leagues)), 'slug': name.lower(), 'name': name,
+                                      'region': team['homeLeague']['region'], 'image': ""})
+
+    return list(leagues.values())
+
+
+class FixtureSession:
+    """Replacement of requests.Session answering every request from in-memory payloads by endpoint name (see
+    endpoint_name). Payloads are encoded once, so benchmarks only measure the client side work."""
+
+    def __init__(self, payloads: dict):
+        self.headers = {}
+        self.contents = {endpoint: json_backend.dumps(payload).encode("utf-8")
+                         for endpoint, payload in payloads.items()}
+        self.requests_count = 0
+
+    def get(self, url, params=None, headers=None, stream=False, **kwargs) -> requests.Response:
+        self.requests_count += 1
+        content = self.contents.get(endpoint_name(url))
+
+        response = requests.Response()
+        response.url = url
+        response.encoding = 'utf-8'
+        if content is None:
+            response.status_code = 404
+            response._content = b""
+        else:
+            response.status_code = 200
+            response._content = content
+            response.headers['Content-Type'] = "application/json"
+        response.raw = io.BytesIO(response._content)
+
+        return response
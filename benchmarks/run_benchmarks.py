@@ -0,0 +1,156 @@
+import argparse
+import datetime
+import logging
+import platform
+import statistics
+import time
+import tracemalloc
+
+from config import root_dir
+from lolesportapi import LoLEsportApi
+from triforce_support import db_triforce_utils as triforce_utils
+from triforce_support.parallel_transforms import ParallelTransforms
+from utils import json_backend
+from utils.rate_limiter import RequestScheduler, TokenBucket
+from benchmarks.fixtures import (load_fixture, scale_teams, scale_frames, standings_from_tournament_teams,
+                                 live_events_from_event_details, leagues_from_teams, FixtureSession)
+
+log = logging.getLogger(__name__)
+
+
+def build_api(factor: int) -> LoLEsportApi:
+    """LoLEsportApi answering from the json_examples fixtures scaled factor times, without rate limit."""
+    teams = scale_teams(load_fixture("get_teams")['teams'], factor)
+    window = load_fixture("LCK_get_window")
+    details = load_fixture("LCK_get_details")
+
+    payloads = {
+        'getTeams': {'data': {'teams': teams}},
+        'getLeagues': {'data': {'leagues': leagues_from_teams(teams)}},
+        'getStandings': {'data': {'standings': standings_from_tournament_teams(
+            load_fixture("get_teams_for_tournament_lec_2021_summer"), factor)}},
+        'getLive': {'data': {'schedule': {'events': live_events_from_event_details(
+            load_fixture("LCK_get_event_details"), factor)}}},
+        'window': {**window, 'frames': scale_frames(window['frames'], factor)},
+        'details': {**details, 'frames': scale_frames(details['frames'], factor)}
+    }
+
+    api = LoLEsportApi(scheduler=RequestScheduler(TokenBucket(rate=1e9, capacity=1e9, max_rate=1e9)))
+    api.session = FixtureSession(payloads)
+    return api
+
+
+def db_rows(rows: list, columns: list) -> list:
+    """Rows as returned by Database.get (dicts with a serial id), from the rows built by the transformers."""
+    return [{'id': i, **dict(zip(columns, row)), 'ext_id': int(row[0])} for i, row in enumerate(rows, start=1)]
+
+
+def transform_all(api: LoLEsportApi):
+    """The transformers of an update_triforce run, from the API responses to the rows of every table."""
+    leagues = api.get_leagues()
+    teams = api.get_teams(only_active=True)
+    players = api.get_players()
+
+    leagues_rows = db_rows(triforce_utils.leagues_to_sql(leagues), ["ext_id", "slug", "name", "region", "image"])
+    teams_sql = triforce_utils.teams_to_sql(teams, leagues_rows)
+    players_sql = triforce_utils.players_to_sql(players)
+
+    return triforce_utils.teams_players_relation_to_sql(players, db_rows(players_sql, ["ext_id"]),
+                                                        db_rows(teams_sql, ["ext_id"]))
+
+
+# Process pool of the parallel benchmarks, peak memory of its workers is not traced
+PARALLEL_TRANSFORMS = ParallelTransforms()
+
+# Benchmark name: function doing the work with the API of the fixtures
+BENCHMARKS = {
+    'get_players': lambda api: api.get_players(),
+    'get_players_parallel': lambda api: PARALLEL_TRANSFORMS.players_from_teams(api.get_teams()),
+    'iter_players': lambda api: sum(1 for _ in api.iter_players()),
+    'get_teams_for_tournament': lambda api: api.get_teams_for_tournament("0"),
+    'get_teams_for_tournament_simplify': lambda api: api.get_teams_for_tournament("0", simplify_data_mode=True),
+    'get_merged_window_details_frames': lambda api: api.get_merged_window_details_frames(
+        *api.get_window_details("0")),
+    'get_live_games_info': lambda api: api.get_live_games_info(),
+    'db_triforce_transformers': transform_all
+}
+
+
+def measure(function, api: LoLEsportApi, repeat: int) -> dict:
+    """Time (best and median of repeat runs) and peak memory (traced on one extra run) of function(api)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(api)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(api)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'best_seconds': min(times), 'median_seconds': statistics.median(times), 'peak_memory_bytes': peak_memory,
+            'repeat': repeat}
+
+
+def run_benchmarks(scales: list, names: list = None, repeat: int = 5) -> dict:
+    results = {}
+    for scale in scales:
+        api = build_api(scale)
+        for name in names or BENCHMARKS:
+            result = measure(BENCHMARKS[name], api, repeat)
+            results.setdefault(name, {})[str(scale)] = result
+            print(f"{name:<36} x{scale:<4} best {result['best_seconds'] * 1000:10.2f} ms   "
+                  f"median {result['median_seconds'] * 1000:10.2f} ms   "
+                  f"peak {result['peak_memory_bytes'] / 2 ** 20:9.2f} MiB")
+
+    return {
+        'created': datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'python': platform.python_version(),
+        'json_backend': "orjson" if json_backend.orjson else "json",
+        'results': results
+    }
+
+
+def compare_results(baseline: dict, current: dict):
+    """Print the time and memory ratios (current / baseline) of the benchmarks on both results."""
+    for name, scales in current['results'].items():
+        for scale, result in scales.items():
+            base = baseline['results'].get(name, {}).get(scale)
+            if not base:
+                continue
+            time_ratio = result['best_seconds'] / base['best_seconds'] if base['best_seconds'] else float("nan")
+            memory_ratio = (result['peak_memory_bytes'] / base['peak_memory_bytes']
+                            if base['peak_memory_bytes'] else float("nan"))
+            print(f"{name:<36} x{scale:<4} time {time_ratio:6.2f}x   memory {memory_ratio:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API parsing and triforce transform hot paths with "
+                                                 "the json_examples fixtures.")
+    parser.add_argument("--scales", nargs="*", type=int, default=[1, 10, 100],
+                        help="Copies of the fixture teams and frames.")
+    parser.add_argument("--benchmarks", nargs="*", choices=list(BENCHMARKS), help="All benchmarks if omitted.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=f"{root_dir}/benchmark_results.json", help="JSON file for the results.")
+    parser.add_argument("--compare", metavar="RESULTS_FILE", help="Previous results file to compare with.")
+    args = parser.parse_args()
+
+    # Fixtures have references the transformers warn about (e.g. teams of leagues not on getLeagues)
+    logging.disable(logging.WARNING)
+
+    try:
+        results = run_benchmarks(args.scales, args.benchmarks, args.repeat)
+    finally:
+        PARALLEL_TRANSFORMS.close()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(json_backend.dumps(results, indent=True))
+    print(f"Results saved on {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'rb') as f:
+            compare_results(json_backend.loads(f.read()), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import asyncio
+import datetime
+import logging
+import os
+
+from utils import json_backend
+from utils.metrics import metrics
+from utils.postgres_db import Database
+
+log = logging.getLogger(__name__)
+
+# What publish does when the queue of a subscriber is full
+BLOCK = "block"                 # Wait for free space, slowing down the publisher (backpressure)
+DROP_NEWEST = "drop_newest"     # Discard the published frame
+DROP_OLDEST = "drop_oldest"     # Discard the oldest queued frame to make room
+DISCONNECT = "disconnect"       # Unsubscribe the slow consumer
+
+POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST, DISCONNECT)
+
+# Queued after the last frame when a subscription is closed
+END_OF_STREAM = None
+
+
+class Subscription:
+    """Bounded queue of (game_id, frame) of a FrameBus subscriber, consumed as an async iterator."""
+
+    def __init__(self, name: str, max_queue_size: int = 1000, policy: str = BLOCK):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}, must be one of {POLICIES}")
+        self.name = name
+        self.policy = policy
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is END_OF_STREAM:
+            raise StopAsyncIteration
+        return item
+
+    async def get(self, timeout: float = None):
+        """Next (game_id, frame), None when the subscription is closed. Raises asyncio.TimeoutError after timeout
+        seconds without frames."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def drop(self, count: int = 1):
+        self.dropped += count
+        metrics.increment("frame_bus_dropped_total", count, subscriber=self.name)
+
+    def close(self):
+        """Stop the iteration once the queued frames are consumed."""
+        if self.closed:
+            return
+        self.closed = True
+        while True:
+            try:
+                self.queue.put_nowait(END_OF_STREAM)
+                return
+            except asyncio.QueueFull:
+                # The end of stream can't wait, the oldest frame is dropped for it
+                self.queue.get_nowait()
+                self.drop()
+
+
+class FrameBus:
+    """In-process publish/subscribe of live frames: one poller publishes every frame once and each subscriber gets
+    it on its own bounded queue, with its own full queue policy (see POLICIES).
+
+    Usage
+    -----
+        bus = FrameBus()
+        bus.attach(JsonlFrameSink(f"{root_dir}/live_frames"))
+        bus.attach(TcpFrameBroadcaster(port=8765), policy=DROP_OLDEST)
+        async with AsyncLoLEsportApi() as api:
+            await LiveGameTracker(api, on_frame=bus.publish).run()
+    """
+
+    def __init__(self):
+        self.subscriptions = []
+        self.sink_tasks = []
+
+    def subscribe(self, name: str, max_queue_size: int = 1000, policy: str = BLOCK) -> Subscription:
+        subscription = Subscription(name, max_queue_size=max_queue_size, policy=policy)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        subscription.close()
+
+    async def publish(self, game_id: str, frame: dict):
+        metrics.increment("frame_bus_published_total")
+        for subscription in list(self.subscriptions):
+            if subscription.policy == BLOCK:
+                await subscription.queue.put((game_id, frame))
+                continue
+
+            try:
+                subscription.queue.put_nowait((game_id, frame))
+            except asyncio.QueueFull:
+                if subscription.policy == DROP_NEWEST:
+                    subscription.drop()
+                elif subscription.policy == DROP_OLDEST:
+                    subscription.queue.get_nowait()
+                    subscription.queue.put_nowait((game_id, frame))
+                    subscription.drop()
+                else:
+                    log.warning(f"Subscriber {subscription.name} too slow, disconnected")
+                    self.unsubscribe(subscription)
+
+    def attach(self, sink, name: str = None, max_queue_size: int = 1000, policy: str = BLOCK,
+               flush_interval: float = 5) -> Subscription:
+        """Subscribe a sink (an object with the write(game_id, frame), flush() and close() coroutines) and consume
+        its subscription on a task. The sink is flushed every flush_interval seconds without frames."""
+        subscription = self.subscribe(name or type(sink).__name__, max_queue_size=max_queue_size, policy=policy)
+        self.sink_tasks.append(asyncio.create_task(self.run_sink(sink, subscription, flush_interval)))
+        return subscription
+
+    async def run_sink(self, sink, subscription: Subscription, flush_interval: float):
+        """Consume the subscription of a sink. Sink errors are logged and the frames keep being consumed, and the
+        subscription is removed from the bus whenever the task ends, so a broken sink never blocks publish."""
+        try:
+            if hasattr(sink, "start"):
+                try:
+                    await sink.start()
+                except Exception:
+                    log.exception(f"Error starting sink {subscription.name}")
+            while True:
+                try:
+                    item = await subscription.get(timeout=flush_interval)
+                except asyncio.TimeoutError:
+                    try:
+                        await sink.flush()
+                    except Exception:
+                        log.exception(f"Error flushing sink {subscription.name}")
+                    continue
+                if item is END_OF_STREAM:
+                    break
+                try:
+                    await sink.write(*item)
+                except Exception:
+                    log.exception(f"Error writing frame on sink {subscription.name}")
+        finally:
+            self.unsubscribe(subscription)
+            try:
+                await sink.close()
+            except Exception:
+                log.exception(f"Error closing sink {subscription.name}")
+
+    async def close(self):
+        """Close every subscription and wait for the attached sinks to write their queued frames."""
+        for subscription in list(self.subscriptions):
+            self.subscriptions.remove(subscription)
+            if subscription.policy == BLOCK and not subscription.closed:
+                # Wait for room instead of dropping a queued frame
+                subscription.closed = True
+                await subscription.queue.put(END_OF_STREAM)
+            else:
+                subscription.close()
+        await asyncio.gather(*self.sink_tasks, return_exceptions=True)
+        self.sink_tasks = []
+
+
+class JsonlFrameSink:
+    """Appends every frame as a {"game_id", "frame"} JSON line to files of directory, starting a new file when the
+    current one reaches max_bytes. Frames are written in batches of batch_size on a thread, so file operations
+    don't block the event loop."""
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 2 ** 20, prefix: str = "frames", batch_size: int = 100):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.file = None
+        self.items = []
+        os.makedirs(directory, exist_ok=True)
+
+    def rotate(self):
+        if self.file:
+            self.file.close()
+        name = f"{self.prefix}-{datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}.jsonl"
+        self.file = open(os.path.join(self.directory, name), 'ab')
+        log.info(f"Writing live frames on {self.file.name}")
+
+    def write_items(self, items: list):
+        for game_id, frame in items:
+            if self.file is None or self.file.tell() >= self.max_bytes:
+                self.rotate()
+            self.file.write((json_backend.dumps({'game_id': game_id, 'frame': frame}) + "\n").encode("utf-8"))
+        self.file.flush()
+
+    def close_file(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    async def write(self, game_id: str, frame: dict):
+        self.items.append((game_id, frame))
+        if len(self.items) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self.items:
+            return
+        items, self.items = self.items, []
+        await asyncio.to_thread(self.write_items, items)
+
+    async def close(self):
+        await self.flush()
+        await asyncio.to_thread(self.close_file)
+
+
+class PostgresFrameSink:
+    """Upserts the frames as jsonb rows of the live_frame table (one per game and timestamp), in batches of
+    batch_size frames. Database calls run on a thread, so the event loop isn't blocked."""
+
+    def __init__(self, database: Database, batch_size: int = 500):
+        self.database = database
+        self.batch_size = batch_size
+        self.rows = []
+
+    def create_table(self):
+        self.database.query("CREATE TABLE IF NOT EXISTS live_frame (game_ext_id BIGINT, "
+                            "rfc460_timestamp TIMESTAMPTZ, frame JSONB, "
+                            "PRIMARY KEY (game_ext_id, rfc460_timestamp));")
+
+    async def start(self):
+        await asyncio.to_thread(self.create_table)
+
+    async def write(self, game_id: str, frame: dict):
+        self.rows.append([game_id, frame['rfc460Timestamp'], json_backend.dumps(frame)])
+        if len(self.rows) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        try:
+            await asyncio.to_thread(self.database.upsert_rows, "live_frame",
+                                    ["game_ext_id", "rfc460_timestamp", "frame"], rows,
+                                    conflict_columns=["game_ext_id", "rfc460_timestamp"])
+        except Exception:
+            log.exception(f"Error saving {len(rows)} live frames")
+
+    async def close(self):
+        await self.flush()
+
+
+class TcpFrameBroadcaster:
+    """Local TCP server sending every frame as a {"game_id", "frame"} JSON line to all the connected clients
+    (e.g. dashboards or a websocket relay). Clients with more than max_buffer_bytes pending are disconnected, so
+    one slow client doesn't hold the others."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, max_buffer_bytes: int = 4 * 2 ** 20):
+        self.host = host
+        self.port = port
+        self.max_buffer_bytes = max_buffer_bytes
+        self.server = None
+        self.writers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        log.info(f"Broadcasting live frames on {self.host}:{self.port}")
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.writers.add(writer)
+        log.info(f"Frames client connected from {writer.get_extra_info('peername')}")
+        try:
+            # Clients don't send anything, reading only detects the disconnection
+            await reader.read()
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def write(self, game_id: str, frame: dict):
+        line = (json_backend.dumps({'game_id': game_id, 'frame': frame}) + "\n").encode("utf-8")
+        for writer in list(self.writers):
+            if writer.transport.get_write_buffer_size() > self.max_buffer_bytes:
+                log.warning(f"Frames client {writer.get_extra_info('peername')} too slow, disconnected")
+                self.writers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def flush(self):
+        for writer in list(self.writers):
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self.writers.discard(writer)
+
+    async def close(self):
+        await self.flush()
+        for writer in list(self.writers):
+            writer.close()
+        self.writers = set()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
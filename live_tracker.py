@@ -0,0 +1,175 @@
+import asyncio
+import logging
+
+from async_lolesportapi import AsyncLoLEsportApi
+from lolesportapi import LoLEsportApi
+from utils.lolesport_utilities import get_valid_date as window_date, advance_window_date
+
+log = logging.getLogger(__name__)
+
+
+class GameCursor:
+    """Position of a tracked game on the live stats feed.
+
+    starting_time is the next window time to request and last_timestamp the rfc460Timestamp of the last emitted
+    frame, so frames already emitted are never emitted again.
+    """
+
+    def __init__(self, game_id: str, starting_time: str = None):
+        self.game_id = game_id
+        self.starting_time = starting_time if starting_time else window_date()
+        self.last_timestamp = ""
+        self.empty_polls = 0
+        self.finished = False
+
+    def new_frames(self, frames: list) -> list:
+        """Return the frames newer than the last emitted one and move last_timestamp to the newest of them."""
+        frames = [frame for frame in frames if frame['rfc460Timestamp'] > self.last_timestamp]
+        frames.sort(key=lambda frame: frame['rfc460Timestamp'])
+
+        if frames:
+            self.last_timestamp = frames[-1]['rfc460Timestamp']
+        return frames
+
+    def advance(self, seconds: int = 10):
+        self.starting_time = advance_window_date(self.starting_time, seconds=seconds)
+
+
+class LiveGameTracker:
+    """Long-running tracker of the live games window/details feeds.
+
+    Every in progress game (from get_live_games_info) gets its own cursor. Each poll requests the window (and
+    details) at the cursor time, emits only the frames that weren't emitted before and advances the cursor 10
+    seconds, so overlapping windows are never downloaded twice. A game stops being tracked when one of its frames
+    has gameState "finished" or after max_empty_polls polls without content.
+
+    Frames are emitted as (game_id, frame) through the on_frame callback (a function or coroutine function) and/or
+    the frames() async iterator.
+
+    Usage
+    -----
+        async with AsyncLoLEsportApi() as api:
+            tracker = LiveGameTracker(api)
+            async for game_id, frame in tracker.frames():
+                ...
+    """
+
+    def __init__(self, api: AsyncLoLEsportApi, on_frame=None, with_details: bool = True,
+                 poll_interval: float = 10, live_refresh_interval: float = 60, max_empty_polls: int = 30):
+        self.api = api
+        self.on_frame = on_frame
+        self.with_details = with_details
+        self.poll_interval = poll_interval
+        self.live_refresh_interval = live_refresh_interval
+        self.max_empty_polls = max_empty_polls
+        self.cursors = {}
+        self.tasks = {}
+        self.queue = None
+        self.running = False
+
+    async def emit(self, game_id: str, frame: dict):
+        if self.on_frame:
+            result = self.on_frame(game_id, frame)
+            if asyncio.iscoroutine(result):
+                await result
+        if self.queue is not None:
+            await self.queue.put((game_id, frame))
+
+    async def poll_game(self, cursor: GameCursor) -> list:
+        """Request the window (and details) at the cursor time and return the new frames."""
+        if self.with_details:
+            window, details = await self.api.gather(
+                self.api.get_window(cursor.game_id, valid_datetime=cursor.starting_time),
+                self.api.get_details(cursor.game_id, valid_datetime=cursor.starting_time))
+        else:
+            window = await self.api.get_window(cursor.game_id, valid_datetime=cursor.starting_time)
+            details = None
+
+        if not window or not window.get('frames'):
+            return []
+
+        frames = cursor.new_frames(window['frames'])
+        if not frames:
+            return []
+
+        if details and details.get('frames'):
+            frames = list(LoLEsportApi.iter_merged_window_details_frames(frames, details['frames']))
+        return frames
+
+    async def track_game(self, game_id: str, starting_time: str = None):
+        """Poll a single game until it's finished, emitting every new frame."""
+        cursor = self.cursors.setdefault(game_id, GameCursor(game_id, starting_time=starting_time))
+        log.info(f"Tracking live game {game_id} from {cursor.starting_time}")
+
+        while self.running and not cursor.finished:
+            frames = await self.poll_game(cursor)
+
+            cursor.empty_polls = 0 if frames else cursor.empty_polls + 1
+            for frame in frames:
+                await self.emit(game_id, frame)
+                if frame['gameState'] == "finished":
+                    cursor.finished = True
+
+            if cursor.empty_polls >= self.max_empty_polls:
+                log.warning(f"Game {game_id} without new frames after {cursor.empty_polls} polls, stop tracking")
+                cursor.finished = True
+
+            if cursor.finished:
+                break
+
+            # If the cursor is behind the most recent valid window we keep polling without waiting to catch up
+            previous_time = cursor.starting_time
+            cursor.advance()
+            if cursor.starting_time == previous_time or cursor.starting_time == window_date():
+                await asyncio.sleep(self.poll_interval)
+
+        log.info(f"Stop tracking live game {game_id}")
+
+    async def refresh_live_games(self):
+        live_games = await self.api.get_live_games_info(only_ids=True)
+
+        for game_id in live_games['games']:
+            cursor = self.cursors.get(game_id)
+            if game_id not in self.tasks and not (cursor and cursor.finished):
+                self.tasks[game_id] = asyncio.create_task(self.track_game(game_id))
+
+        for game_id in [game_id for game_id, task in self.tasks.items() if task.done()]:
+            self.tasks.pop(game_id)
+
+    async def run(self):
+        """Track every live game, looking for new live games every live_refresh_interval seconds, until stop()."""
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    await self.refresh_live_games()
+                except Exception:
+                    log.exception("Error refreshing the live games")
+                await asyncio.sleep(self.live_refresh_interval)
+        finally:
+            self.running = False
+            for task in self.tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+            self.tasks = {}
+
+    def stop(self):
+        self.running = False
+
+    async def frames(self, max_queue_size: int = 1000):
+        """Run the tracker and yield every new (game_id, frame) as an async iterator."""
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        runner = asyncio.create_task(self.run())
+        try:
+            while not runner.done() or not self.queue.empty():
+                getter = asyncio.ensure_future(self.queue.get())
+                done, _ = await asyncio.wait({getter, runner}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            self.stop()
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            self.queue = None
@@ -1,10 +1,19 @@
 import datetime
+import json
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 from config import API_KEY, API_BASE_URL, LIVE_STATS_API
 
-from utils.lolesport_utilities import get_valid_date as window_date, check_correct_response, unique_dicts
+from utils.lolesport_utilities import get_valid_date as window_date, check_correct_response, \
+    iter_merged_window_details_frames
+from utils.json_backend import JsonResponse
+from utils.metrics import metrics
+from utils.rate_limiter import RequestScheduler
+from utils.response_cache import ResponseCache, endpoint_name
 from Exceptions.lolesportsapi_exceptions import LoLEsportResponseError, LoLEsportStructureError
+import ijson
 import requests
 
 log = logging.getLogger(__name__)
@@ -12,10 +21,13 @@ log = logging.getLogger(__name__)
 
 class LoLEsportApi:
 
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, cache: ResponseCache = None, scheduler: RequestScheduler = None, session=None):
+        # Any object with the get method and headers of requests.Session, e.g. utils.transport.ReplaySession
+        self.session = session if session else requests.Session()
         self.session.headers.update(API_KEY)
         self.default_language = "en-US"
+        self.cache = cache
+        self.scheduler = scheduler if scheduler else RequestScheduler()
 
     def set_default_language(self, language_code):
         # TODO implement language code error
@@ -29,6 +41,103 @@ class LoLEsportApi:
             """
         self.default_language = language_code
 
+    def send(self, url: str, params: dict, headers: dict = None, stream: bool = False) -> requests.Response:
+        """Send a request through the rate limiter, retrying it if it's throttled or fails. With stream the body
+        isn't downloaded until response.raw is read."""
+        endpoint = endpoint_name(url)
+        with metrics.timer("api_request_seconds", endpoint=endpoint):
+            response = self.scheduler.send(lambda: self.session.get(url, params=params, headers=headers,
+                                                                    stream=stream),
+                                           endpoint,
+                                           retry_exceptions=(requests.ConnectionError, requests.Timeout))
+
+        metrics.increment("api_responses_total", endpoint=endpoint, status=response.status_code)
+        # Streamed bodies aren't downloaded yet, only their announced length is known
+        size = response.headers.get('Content-Length') if stream else len(response.content)
+        if size is not None:
+            metrics.increment("api_response_bytes_total", int(size), endpoint=endpoint)
+        return response
+
+    def get_response(self, url: str, params: dict) -> requests.Response:
+        """Request an endpoint, through the response cache if the class has one. Parameters with None value
+        are not sent."""
+        params = {key: value for key, value in params.items() if value is not None}
+
+        if self.cache:
+            return self.cache.fetch(self.send, url, params=params)
+        return self.send(url, params)
+
+    def request(self, url: str, params: dict, live_stats_data: bool = False, raise_errors: bool = False):
+        """Request an endpoint of the lolesport API and return its data.
+
+            Parameters
+            ----------
+            url : str
+                Full URL of the endpoint.
+            params : dict
+                Query parameters.
+            live_stats_data : bool
+                True for the live stats API (window/details), which doesn't wrap the result on a "data" key and
+                may answer 204 without content.
+            raise_errors : bool
+                If True, an invalid response raises LoLEsportResponseError/LoLEsportStructureError instead of
+                returning None, so callers can tell a failed request from a response without content.
+
+            Returns
+             -------
+            dict
+                None if the response is not valid or there is no content.
+        """
+        # The body is decoded once, checks and callers share the parsed result
+        response = JsonResponse(self.get_response(url, params))
+
+        try:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(f"Response content: {response.text}")
+            check_correct_response(response, live_stats_data=live_stats_data)
+            if live_stats_data:
+                if response.status_code == 204:
+                    return None
+                return response.json()
+            return response.json()['data']
+        except (LoLEsportResponseError, LoLEsportStructureError):
+            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+            if raise_errors:
+                raise
+
+    def stream_items(self, url: str, params: dict, prefix: str):
+        """Request an endpoint of the lolesport API and yield the items at prefix (an ijson prefix, e.g.
+        "data.teams.item") while the response body is parsed incrementally. The response cache is not used.
+
+            Parameters
+            ----------
+            url : str
+                Full URL of the endpoint.
+            params : dict
+                Query parameters.
+            prefix : str
+                ijson prefix of the items to yield.
+
+            Yields
+             -------
+            dict
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+        response = self.send(url, params, stream=True)
+
+        try:
+            if response.status_code != 200:
+                raise LoLEsportResponseError(response.status_code)
+            # Decompress gzip/deflate bodies while reading the raw stream
+            response.raw.decode_content = True
+            yield from ijson.items(response.raw, prefix, use_float=True)
+        except LoLEsportResponseError:
+            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        except ijson.JSONError:
+            log.exception(f"Error parsing LoLEsport API response of {url}")
+        finally:
+            response.close()
+
     def get_leagues(self, hl: str = None) -> dict:
         """Retrieve leagues information (id, slug, name, region, image, priority, displayPriority).
 
@@ -46,16 +155,7 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getLeagues',
-            params={'hl': hl}
-        )
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(API_BASE_URL + '/getLeagues', params={'hl': hl})
 
     def get_tournaments_for_league(self, hl: str = None, league_id: int = None) -> dict:
         """Retrieve all splits/formats info for a given league (id, slug, startDate, endDate).
@@ -77,19 +177,7 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getTournamentsForLeague',
-            params={
-                'hl': hl,
-                'leagueId': league_id
-            }
-        )
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(API_BASE_URL + '/getTournamentsForLeague', params={'hl': hl, 'leagueId': league_id})
 
     def get_standings(self, tournament_id, hl: str = None):
         """Retrieve the position splits/formats info for a given tournaments (id, slug, startDate, endDate).
@@ -112,19 +200,7 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getStandings',
-            params={
-                'hl': hl,
-                'tournamentId': tournament_id
-            }
-        )
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(API_BASE_URL + '/getStandings', params={'hl': hl, 'tournamentId': tournament_id})
 
     def get_schedule(self, hl=None, league_id: int = None, pagetoken: str = None):
         """Retrieve the schedule for a given league (blockName, league(name, slug), match(flags,id,strategy,teams),
@@ -151,21 +227,108 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getSchedule',
-            params={
-                'hl': hl,
-                'leagueId': league_id,
-                'pageToken': pagetoken
-            }
-        )
+        return self.request(API_BASE_URL + '/getSchedule',
+                            params={'hl': hl, 'leagueId': league_id, 'pageToken': pagetoken})
 
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+    def iter_schedule(self, league_ids=None, direction: str = "older", since=None, until=None,
+                      hl=None, resume_file: str = None):
+        """Generator of the schedule events of the given leagues, following the page tokens of getSchedule.
+
+        Pages are requested lazily, and while the events of a page are consumed the next page is already being
+        requested on a background thread. Only the events with startTime between since and until are yielded, and
+        no more pages are requested once a page is completely out of those bounds on the followed direction.
+
+            Parameters
+            ----------
+            league_ids : str, list (optional)
+                The league(s) ID(s) of which schedule will be requested. If not provided the schedule for all leagues
+                will be requested.
+
+            direction : str (optional)
+                "older" to go back in time or "newer" to go forward, starting from the current page.
+
+            since : datetime.datetime, datetime.date (optional)
+                Lower bound of the events startTime. Naive datetimes and dates are taken as UTC.
+
+            until : datetime.datetime, datetime.date (optional)
+                Upper bound of the events startTime. Naive datetimes and dates are taken as UTC.
+
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            resume_file : str (optional)
+                Path of a JSON file where the token of the next page is saved after each page is consumed.
+                If the file exists, the schedule is resumed from the saved token, so a page that wasn't completely
+                consumed is yielded again.
+
+            Yields
+             -------
+            dict
+        """
+        if direction not in ("older", "newer"):
+            raise ValueError(f"Direction must be 'older' or 'newer', not '{direction}'")
+
+        if isinstance(league_ids, (list, tuple)):
+            league_ids = ",".join(str(league_id) for league_id in league_ids)
+
+        def to_datetime(value):
+            if value is None:
+                return None
+            if not isinstance(value, datetime.datetime):
+                value = datetime.datetime.combine(value, datetime.time.min)
+            # startTime is UTC, so naive bounds are taken as UTC
+            return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+
+        since = to_datetime(since)
+        until = to_datetime(until)
+
+        pagetoken = None
+        if resume_file and os.path.exists(resume_file):
+            with open(resume_file, encoding='utf-8') as f:
+                resume_data = json.load(f)
+            if resume_data.get('league_ids') == league_ids and resume_data.get('direction') == direction:
+                pagetoken = resume_data.get('token')
+                log.info(f"Resuming schedule from page {pagetoken}")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page = executor.submit(self.get_schedule, hl=hl, league_id=league_ids, pagetoken=pagetoken)
+
+            while next_page:
+                page = next_page.result()
+                if not page:
+                    log.warning(f"Schedule page {pagetoken} not retrieved, stopping the schedule iteration")
+                    return
+
+                schedule = page['schedule']
+                events = schedule.get('events', [])
+                pagetoken = (schedule.get('pages') or {}).get(direction)
+
+                start_times = [datetime.datetime.strptime(event['startTime'], "%Y-%m-%dT%H:%M:%SZ")
+                               .replace(tzinfo=datetime.timezone.utc) for event in events]
+
+                # Stop following pages once the whole page is out of bounds on the followed direction
+                out_of_bounds = start_times and (
+                        (direction == "older" and since and max(start_times) < since)
+                        or (direction == "newer" and until and min(start_times) > until))
+                if out_of_bounds or not pagetoken:
+                    pagetoken = None
+
+                # Prefetch the next page while the current one is consumed
+                next_page = (executor.submit(self.get_schedule, hl=hl, league_id=league_ids, pagetoken=pagetoken)
+                             if pagetoken else None)
+
+                page_events = zip(events, start_times)
+                if direction == "older":
+                    page_events = reversed(list(page_events))
+                for event, start_time in page_events:
+                    if (since and start_time < since) or (until and start_time > until):
+                        continue
+                    yield event
+
+                if resume_file:
+                    with open(resume_file, 'w', encoding='utf-8') as f:
+                        json.dump({'league_ids': league_ids, 'direction': direction, 'token': pagetoken}, f)
 
     def get_live(self, hl=None):
         """Retrieve the current live matches
@@ -184,17 +347,7 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getLive',
-            params={'hl': hl}
-        )
-
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(API_BASE_URL + '/getLive', params={'hl': hl})
 
     def get_completed_events(self, hl=None, tournament_id=None):
 
@@ -221,20 +374,7 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getCompletedEvents',
-            params={
-                'hl': hl,
-                'tournamentId': tournament_id
-            }
-        )
-
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(API_BASE_URL + '/getCompletedEvents', params={'hl': hl, 'tournamentId': tournament_id})
 
     def get_event_details(self, match_id, hl=None):
 
@@ -258,19 +398,7 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getEventDetails',
-            params={
-                'hl': hl,
-                'id': match_id
-            }
-        )
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(API_BASE_URL + '/getEventDetails', params={'hl': hl, 'id': match_id})
 
     def get_games(self, hl=None, match_id=None):
 
@@ -296,21 +424,7 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getGames',
-            params={
-                'hl': hl,
-                'id': match_id
-            }
-
-        )
-
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(API_BASE_URL + '/getGames', params={'hl': hl, 'id': match_id})
 
     def get_teams(self, hl=None, team_identifier=None, only_active: bool = False):
 
@@ -338,23 +452,44 @@ class LoLEsportApi:
         if hl is None:
             hl = self.default_language
 
-        response = self.session.get(
-            API_BASE_URL + '/getTeams',
-            params={
-                'hl': hl,
-                'id': team_identifier
-            }
-        )
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=False)
-            if only_active:
-                teams = response.json()['data'].get("teams", None)
-                if teams:
-                    return {"teams": [team for team in teams if team["status"] == "active"]}
-            return response.json()['data']
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        data = self.request(API_BASE_URL + '/getTeams', params={'hl': hl, 'id': team_identifier})
+
+        if data and only_active:
+            teams = data.get("teams", None)
+            if teams:
+                return {"teams": [team for team in teams if team["status"] == "active"]}
+        return data
+
+    def iter_teams(self, hl=None, team_identifier=None, only_active: bool = False):
+        """Streaming version of get_teams, yielding each team as the getTeams response is parsed, without loading
+        the whole response in memory.
+
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            team_identifier: str, id (optional)
+                The team slug or id of which information will be requested.
+                If team_slug is not provided all teams will be requested.
+
+            only_active: bool (optional)
+                True will yield only teams with players and active
+
+            Yields
+             -------
+            dict
+        """
+
+        if hl is None:
+            hl = self.default_language
+
+        for team in self.stream_items(API_BASE_URL + '/getTeams', params={'hl': hl, 'id': team_identifier},
+                                      prefix='data.teams.item'):
+            if only_active and team["status"] != "active":
+                continue
+            yield team
 
     def get_window(self, game_id, valid_datetime=None):
 
@@ -373,22 +508,9 @@ class LoLEsportApi:
     """
         if not valid_datetime:
             valid_datetime = window_date()
-        response = self.session.get(
-            LIVE_STATS_API + f'/window/{game_id}',
-            params={
-                'startingTime': valid_datetime
-            }
-        )
-
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=True)
-            if response.status_code == 204:
-                return None
-            else:
-                return response.json()
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(LIVE_STATS_API + f'/window/{game_id}',
+                            params={'startingTime': valid_datetime},
+                            live_stats_data=True)
 
     def get_details(self, game_id, participant_ids=None, valid_datetime: str = None):
 
@@ -417,22 +539,9 @@ class LoLEsportApi:
                 # TODO Error type not valid
         if not valid_datetime:
             valid_datetime = window_date()
-        response = self.session.get(
-            LIVE_STATS_API + f'/details/{game_id}',
-            params={
-                'startingTime': valid_datetime,
-                'participantIds': participant_ids
-            }
-        )
-        try:
-            log.debug(f"Response content: {response.text}")
-            check_correct_response(response, live_stats_data=True)
-            if response.status_code == 204:
-                return None
-            else:
-                return response.json()
-        except (LoLEsportResponseError, LoLEsportStructureError):
-            log.exception(f"Error on LoLEsport API response. Response: {response.text}")
+        return self.request(LIVE_STATS_API + f'/details/{game_id}',
+                            params={'startingTime': valid_datetime, 'participantIds': participant_ids},
+                            live_stats_data=True)
 
     def get_teams_for_tournament(self, tournament_id, hl=None, simplify_data_mode: bool = False):
         """
@@ -462,6 +571,181 @@ class LoLEsportApi:
 
         standings = self.get_standings(tournament_id=tournament_id, hl=hl)['standings']
 
+        return self.teams_from_standings(standings, simplify_data_mode=simplify_data_mode)
+
+    def get_teams_for_tournaments(self, tournament_ids: list, hl=None, simplify_data_mode: bool = False):
+        """
+        Retrieve the participating teams of several tournaments with a single getStandings request.
+        See get_teams_for_tournament for the format of each tournament result.
+
+        Parameters
+        ----------
+        tournament_ids : list
+            The tournament IDs.
+
+        hl : str
+            The language code in which the information will be requested.
+            If not provided, take the default language value from the class.
+
+        simplify_data_mode : bool (Optional)
+            If true, the function only returns basic team information (id, name, slug, code, image)
+
+        Returns
+         -------
+        dict
+            Participating teams keyed by tournament id. None if the standings couldn't be retrieved.
+        """
+
+        if hl is None:
+            hl = self.default_language
+
+        standings = self.get_standings(tournament_id=",".join([str(tournament_id)
+                                                               for tournament_id in tournament_ids]), hl=hl)
+        if not standings:
+            return None
+
+        return self.teams_by_tournament_from_standings(tournament_ids, standings['standings'],
+                                                       simplify_data_mode=simplify_data_mode)
+
+    def get_players(self, hl=None, team_identifier=None):
+
+        """Get players for a team (id,summonerName,firstName,lastName,image,rol).
+        If team_identifier is not provided all players will be requested, adding to the previous
+        information to which team(s) the player belong(s).
+
+            Parameters
+            ----------
+            hl : str
+              The language code in which the information will be requested.
+              If not provided, take the default language value from the class.
+
+            team_identifier: str, id (optional)
+              The team slug or id of which information will be requested.
+              If team_slug is not provided all teams will be requested.
+
+            Returns
+            -------
+            dict
+        """
+
+        if hl is None:
+            hl = self.default_language
+
+        data = self.get_teams(hl=hl, team_identifier=team_identifier)
+
+        return self.players_from_teams(data, keep_teams=not team_identifier)
+
+    def iter_players(self, hl=None, team_identifier=None):
+        """Streaming version of get_players, yielding each player as the getTeams response is parsed (see iter_teams
+        and iter_players_from_teams).
+
+            Parameters
+            ----------
+            hl : str
+              The language code in which the information will be requested.
+              If not provided, take the default language value from the class.
+
+            team_identifier: str, id (optional)
+              The team slug or id of which information will be requested.
+              If team_slug is not provided all teams will be requested.
+
+            Yields
+            -------
+            dict
+        """
+
+        if hl is None:
+            hl = self.default_language
+
+        teams = self.iter_teams(hl=hl, team_identifier=team_identifier)
+
+        yield from self.iter_players_from_teams(teams, keep_teams=not team_identifier)
+
+    def get_live_games_info(self, only_ids: bool = False, hl=None):
+        """Get the games in progress of the live matches. See live_games_from_events for the format.
+
+            Parameters
+            ----------
+            only_ids : bool (optional)
+                If True only the ids of the in progress games are returned.
+
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
+
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
+
+        live_data = self.get_live(hl=hl)['schedule']['events']
+
+        return self.live_games_from_events(live_data, only_ids=only_ids)
+
+    def get_window_details(self, game_id: str):
+        """Get the window and the details of a game for the same (current) window time, ready to be merged with
+        get_merged_window_details_frames.
+
+            Parameters
+            ----------
+            game_id : str
+                The game id of which information will be requested.
+
+            Returns
+             -------
+            tuple
+                (window, details)
+        """
+        valid_datetime = window_date()
+        window = self.get_window(game_id=game_id, valid_datetime=valid_datetime)
+        details = self.get_details(game_id=game_id, valid_datetime=valid_datetime)
+
+        return window, details
+
+    @staticmethod
+    def get_merged_window_details_frames(window, details):
+        """Merge the frames of a window and a details response of the same game.
+        See iter_merged_window_details_frames for the merge rules.
+
+            Parameters
+            ----------
+            window : dict
+                Response of get_window.
+            details : dict
+                Response of get_details.
+
+            Returns
+             -------
+            dict
+        """
+        return {'frames': list(LoLEsportApi.iter_merged_window_details_frames(window['frames'], details['frames']))}
+
+    @staticmethod
+    def iter_merged_window_details_frames(window_frames, details_frames, combine_participants: bool = False):
+        """Generator of merged frames, see utils.lolesport_utilities.iter_merged_window_details_frames."""
+        return iter_merged_window_details_frames(window_frames, details_frames, combine_participants)
+
+    @staticmethod
+    def teams_from_standings(standings: list, simplify_data_mode: bool = False) -> dict:
+        """
+        Build the participating teams of a tournament from the "standings" list returned by getStandings.
+        See get_teams_for_tournament for the output format.
+
+        Parameters
+        ----------
+        standings : list
+            The "standings" list of a getStandings response.
+
+        simplify_data_mode : bool (Optional)
+            If true, the function only returns basic team information (id, name, slug, code, image)
+
+        Returns
+         -------
+        dict
+        """
+
         # Separate stages (Play-in, play-off, regular season, etc)
         stages = [stage for stages in standings for stage in stages['stages']]
 
@@ -495,133 +779,172 @@ class LoLEsportApi:
             # If the type of stage is bracket (for example a play-in phase) we process each match of the stage,
             # processing each team from those matches.
             # We extract the result of the team in that match, and relate it to the phase.
-            # If the team is not yet in the stage dictionary, we add it,if it is already in the dictionary, we append
-            # the match result to the "results" section of that team.
+            # Teams are indexed by id, so the first match of a team adds it to the stage and the next ones append
+            # the match result to the "results" section of that team. Teams keep the order of their first match.
             elif stage['type'] == "bracket":
+                teams_by_id = {}
                 for section in stage['sections']:
                     for match in section['matches']:
                         for team in match['teams']:
 
-                            current_team = team
+                            # Placeholder of a team not decided yet
+                            if team['id'] == "0":
+                                continue
 
-                            outcome = current_team.pop('result')
+                            outcome = team.get('result')
                             outcome = outcome['outcome'] if outcome else None
 
                             result = {'phase': section['name'], 'outcome': outcome}
 
-                            if current_team['id'] == "0":
-                                continue
-                            elif current_team['id'] not in [team['id'] for team in stage_teams['teams']]:
+                            team_dict = teams_by_id.get(team['id'])
+                            if team_dict is None:
+                                team_dict = {key: value for key, value in team.items() if key != 'result'}
+                                team_dict['results'] = []
+                                teams_by_id[team['id']] = team_dict
 
-                                team_dict = {
-                                    **current_team,
-                                    'results': [result]
-                                }
-                                stage_teams['teams'].append(team_dict)
+                            team_dict['results'].append(result)
 
-                            else:
-
-                                index_team = stage_teams['teams'].index(next(filter(lambda n:
-                                                                                    n.get('id') == current_team['id'],
-                                                                                    stage_teams['teams'])))
-                                team_data = stage_teams['teams'].pop(index_team)
-
-                                team_data['results'].append(result)
-
-                                stage_teams['teams'].append(team_data)
+                stage_teams['teams'] = list(teams_by_id.values())
 
             # Every processed stage is appended to the stage dictionary
             custom_stages['stages'].append(stage_teams)
 
         # If simplify_data_mode is True, the custom_stages dictionary is reprocessed to a new dictionary
-        # to only return each team once with only 5 properties (id, name, slug, code, image)
+        # to only return each team once (in the order they are first seen) with only 5 properties
+        # (id, name, slug, code, image)
         # Else the dictionary with all stages will be return
         if simplify_data_mode:
-            teams_data_simplify = {'teams': []}
-            for team in [team for stage in custom_stages['stages'] for team in stage['teams']]:
-                team_dict = {
-                    'id': team['id'],
-                    'name': team['name'],
-                    'slug': team['slug'],
-                    'code': team['code'],
-                    'image': team['image']
-                }
-                if team['id'] not in [team['id'] for team in teams_data_simplify['teams']]:
-                    teams_data_simplify['teams'].append(team_dict)
-            return teams_data_simplify
+            teams_by_id = {}
+            for stage in custom_stages['stages']:
+                for team in stage['teams']:
+                    if team['id'] not in teams_by_id:
+                        teams_by_id[team['id']] = {
+                            'id': team['id'],
+                            'name': team['name'],
+                            'slug': team['slug'],
+                            'code': team['code'],
+                            'image': team['image']
+                        }
+            return {'teams': list(teams_by_id.values())}
         else:
             return custom_stages
 
-    def get_players(self, hl=None, team_identifier=None):
+    @staticmethod
+    def teams_by_tournament_from_standings(tournament_ids: list, standings: list,
+                                           simplify_data_mode: bool = False) -> dict:
+        """
+        Build the participating teams of each tournament from the "standings" list of a getStandings request of
+        several tournaments, which has the standings of each tournament in the requested order.
 
-        """Get players for a team (id,summonerName,firstName,lastName,image,rol).
-        If team_identifier is not provided all players will be requested, adding to the previous
-        information to which team(s) the player belong(s).
+        Parameters
+        ----------
+        tournament_ids : list
+            The requested tournament IDs, in the order of the request.
+
+        standings : list
+            The "standings" list of the getStandings response.
+
+        simplify_data_mode : bool (Optional)
+            If true, the function only returns basic team information (id, name, slug, code, image)
+
+        Returns
+         -------
+        dict
+            Participating teams keyed by tournament id. None if there isn't one standings per tournament.
+        """
+
+        if len(standings) != len(tournament_ids):
+            log.error(f"Got {len(standings)} standings for {len(tournament_ids)} tournaments, they can't be matched")
+            return None
+
+        return {tournament_id: LoLEsportApi.teams_from_standings([tournament_standings],
+                                                                 simplify_data_mode=simplify_data_mode)
+                for tournament_id, tournament_standings in zip(tournament_ids, standings)}
+
+    @staticmethod
+    def players_from_teams(data: dict, keep_teams: bool = True) -> dict:
+        """Build the players dictionary from a getTeams response. See get_players for the output format.
 
             Parameters
             ----------
-            hl : str
-              The language code in which the information will be requested.
-              If not provided, take the default language value from the class.
+            data : dict
+              The "data" dictionary of a getTeams response.
 
-            team_identifier: str, id (optional)
-              The team slug or id of which information will be requested.
-              If team_slug is not provided all teams will be requested.
+            keep_teams: bool (optional)
+              If False the "teams" key is removed from player's information.
 
             Returns
             -------
             dict
         """
 
-        if hl is None:
-            hl = self.default_language
+        return {'players': list(LoLEsportApi.iter_players_from_teams(data['teams'], keep_teams=keep_teams))}
 
-        data = self.get_teams(hl=hl, team_identifier=team_identifier)
+    @staticmethod
+    def iter_players_from_teams(teams, keep_teams: bool = True):
+        """Generator of the players of a getTeams "teams" list, in the order they are first seen.
+
+        Each player is yielded as soon as its first team is processed. Its "teams" list keeps growing while later
+        teams are processed, so it's only complete once the generator is exhausted.
+
+            Parameters
+            ----------
+            teams : iterable
+              Teams of a getTeams response. Can be any iterable, teams are processed as they are consumed.
 
-        # Removing placeholders team from the data
-        data = [team for team in data['teams'] if
-                (team['slug'] != "tbd" and team['name'] != "TBD") or team['id'] != "0"]
+            keep_teams: bool (optional)
+              If False the "teams" key is not added to player's information.
 
-        # Initialization of the custom formatted dictionary
-        players_dict = {'players': []}
+            Yields
+            -------
+            dict
+        """
 
-        # Processing each player of each team on the retrieved data
+        # Players already yielded, by id
+        players = {}
+
+        # Processing each player of each team on the retrieved data, removing placeholders teams.
         # Only players on active teams and who have a role in it will be added on the custom formatted dictionary.
         # The ID of the team to which the player belongs is added to his information.
-        # the first time we add him to the dictionary means that he belongs to more than one team,
+        # If the player was already yielded, he belongs to more than one team,
         # so we add the team's ID to the "teams" key of the player's information.
-        for team in data:
-            for player in team['players']:
-                if team['status'] != "archived" and player['role'] != "none":
-                    if player['id'] in [player['id'] for player in players_dict['players']]:
-                        index_player = players_dict['players'].index(
-                            next(filter(lambda n: n.get('id') == player['id'], players_dict['players'])))
+        for team in teams:
+            if not ((team['slug'] != "tbd" and team['name'] != "TBD") or team['id'] != "0"):
+                continue
+            if team['status'] == "archived":
+                continue
 
-                        player_data = players_dict['players'].pop(index_player)
+            for player in team['players']:
+                if player['role'] == "none":
+                    continue
 
+                player_data = players.get(player['id'])
+                if player_data is not None:
+                    if keep_teams:
                         player_data['teams'].append(team['id'])
+                    continue
 
-                        players_dict['players'].append(player_data)
-                    else:
-                        custom_player_dict = {
-                            **player,
-                            'teams': [team['id']]
-                        }
-                        players_dict['players'].append(custom_player_dict)
+                player_data = {**player, 'teams': [team['id']]} if keep_teams else {**player}
+                players[player['id']] = player_data
 
-        # If the user specify a team identifier, we remove the "teams" key from player's information
-        if team_identifier:
-            for player in players_dict['players']:
-                player.pop('teams')
+                yield player_data
 
-        return players_dict
+    @staticmethod
+    def live_games_from_events(live_data: list, only_ids: bool = False) -> dict:
+        """Build the in progress games information from the "events" list returned by getLive.
 
-    def get_live_games_info(self, only_ids: bool = False, hl=None):
+            Parameters
+            ----------
+            live_data : list
+                The schedule "events" list of a getLive response.
 
-        if hl is None:
-            hl = self.default_language
+            only_ids : bool (optional)
+                If True only the ids of the in progress games are returned.
 
-        live_data = self.get_live(hl=hl)['schedule']['events']
+            Returns
+             -------
+            dict
+        """
 
         live_games_data = {'games': []}
 
@@ -694,83 +1017,68 @@ class LoLEsportApi:
             return {'games': [game_info['game']['id'] for game_info in live_games_data['games']]}
         return live_games_data
 
-    def get_window_details(self, game_id: str):
-        valid_datetime = window_date()
-        window = self.get_window(game_id=game_id, valid_datetime=valid_datetime)
-        details = self.get_details(game_id=game_id, valid_datetime=valid_datetime)
+    def get_tournaments_league_related(self, hl=None, league_id=None, mode="ongoing"):
+        """Retrieve the tournaments of the leagues, each one with its league information.
+        See tournaments_from_leagues for the format.
 
-        return window, details
+            Parameters
+            ----------
+            hl : str
+                The language code in which the information will be requested.
+                If not provided, take the default language value from the class.
 
-    @staticmethod
-    def get_merged_window_details_frames(window, details):
+            league_id: int, str (optional)
+                The league(s) ID(s) of which tournaments will be requested, several as a single string separated by
+                comas. If not provided the tournaments of all leagues will be requested.
 
-        window['frames'] = unique_dicts(window['frames'], 'rfc460Timestamp')
-        details['frames'] = unique_dicts(details['frames'], 'rfc460Timestamp')
+            mode : str (optional)
+                "ongoing" keeps only tournaments in progress, "not_ended" keeps in progress and future tournaments.
+                Any other value keeps every tournament.
 
-        merged_window = {
-            'frames': []
-        }
+            Returns
+             -------
+            dict
+        """
+        if hl is None:
+            hl = self.default_language
 
-        for i, window_frame in enumerate(window['frames']):
-            players_details_frame = details['frames'][i]
+        leagues = self.get_leagues(hl=hl)
+        if not league_id:
+            league_id = ",".join([league['id'] for league in leagues['leagues']])
+        else:
+            # Keep only the requested leagues so they stay aligned with the tournaments response
+            league_ids = str(league_id).split(",")
+            leagues = {'leagues': [league for league in leagues['leagues'] if league['id'] in league_ids]}
 
-            new_frame_dict = {
-                'rfc460Timestamp': window_frame['rfc460Timestamp'],
-                'gameState': window_frame['gameState']
-            }
+        tournaments = self.get_tournaments_for_league(hl=hl, league_id=league_id)['leagues']
 
-            if players_details_frame['rfc460Timestamp'] != window_frame['rfc460Timestamp']:
-                log.warning(f"TimeStamp don't match.\r\n"
-                            f"Details: {players_details_frame['rfc460Timestamp']}\r\n"
-                            f"Window: {window_frame['rfc460Timestamp']}")
+        return self.tournaments_from_leagues(leagues, tournaments, mode=mode)
 
-                log.warning(f"Window {window}")
-                log.warning(f"Details {details}")
-            else:
-                for player in [player for player in window_frame['blueTeam']['participants']]:
-                    [details_player] = list(filter(lambda n: n.get('participantId') == player['participantId'],
-                                                   players_details_frame['participants']))
-
-                    index_player = window_frame['blueTeam']['participants'].index(next(filter(lambda n:
-                                                                                              n.get('participantId') ==
-                                                                                              player['participantId'],
-                                                                                              window_frame['blueTeam'][
-                                                                                                  'participants'])))
-                    window_frame['blueTeam']['participants'].pop(index_player)
-                    window_frame['blueTeam']['participants'].append(details_player)
-
-                for player in [player for player in window_frame['redTeam']['participants']]:
-                    [details_player] = list(filter(lambda n: n.get('participantId') == player['participantId'],
-                                                   players_details_frame['participants']))
-
-                    index_player = window_frame['redTeam']['participants'].index(next(filter(lambda n:
-                                                                                             n.get('participantId') ==
-                                                                                             player['participantId'],
-                                                                                             window_frame['redTeam'][
-                                                                                                 'participants'])))
-                    window_frame['redTeam']['participants'].pop(index_player)
-                    window_frame['redTeam']['participants'].append(details_player)
-                new_frame_dict['blue'] = window_frame['blueTeam']
-                new_frame_dict['red'] = (window_frame['redTeam'])
-
-            merged_window['frames'].append(new_frame_dict)
-
-        return merged_window
+    @staticmethod
+    def tournaments_from_leagues(leagues: dict, tournaments: list, mode: str = "ongoing") -> dict:
+        """Relate each tournament of a getTournamentsForLeague response with its league, filtering them by date.
 
-    def get_tournaments_league_related(self, hl=None, league_id=None, mode="ongoing"):
+            Parameters
+            ----------
+            leagues : dict
+                The "data" dictionary of a getLeagues response.
 
-        if hl is None:
-            hl = self.default_language
+            tournaments : list
+                The "leagues" list of a getTournamentsForLeague response, in the same order as leagues.
 
-        if not league_id:
-            leagues = self.get_leagues(hl=hl)
-            league_id = ",".join([league['id'] for league in leagues['leagues']])
+            mode : str (optional)
+                "ongoing" keeps only tournaments in progress, "not_ended" keeps in progress and future tournaments.
+                Any other value keeps every tournament.
+
+            Returns
+             -------
+            dict
+        """
         data = {
             'tournaments': []
         }
         today_date = datetime.datetime.utcnow().date()
 
-        tournaments = self.get_tournaments_for_league(hl=hl, league_id=league_id)['leagues']
         for i, league in enumerate(leagues['leagues']):
 
             league.pop('priority')
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules are imported from the project root, like the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
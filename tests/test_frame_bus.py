@@ -0,0 +1,78 @@
+import asyncio
+
+from frame_bus import FrameBus, BLOCK
+
+
+class FailingSink:
+
+    def __init__(self, fail_on: str):
+        self.fail_on = fail_on
+        self.frames = []
+        self.closed = False
+
+    async def start(self):
+        if self.fail_on == "start":
+            raise RuntimeError("start failed")
+
+    async def write(self, game_id: str, frame: dict):
+        self.frames.append((game_id, frame))
+        # Keep the queue full long enough for the flush timeout to fire
+        await asyncio.sleep(0.02)
+
+    async def flush(self):
+        if self.fail_on == "flush":
+            raise RuntimeError("flush failed")
+
+    async def close(self):
+        self.closed = True
+
+
+async def publish_frames(fail_on: str, count: int = 10):
+    bus = FrameBus()
+    sink = FailingSink(fail_on)
+    bus.attach(sink, max_queue_size=3, policy=BLOCK, flush_interval=0.01)
+
+    for i in range(count):
+        await asyncio.wait_for(bus.publish("game", {'rfc460Timestamp': str(i)}), timeout=2)
+        if i == 4:
+            # Let the sink time out waiting for frames, so it flushes
+            await asyncio.sleep(0.3)
+
+    await asyncio.wait_for(bus.close(), timeout=2)
+    return bus, sink
+
+
+def test_publish_returns_when_sink_start_fails():
+    bus, sink = asyncio.run(publish_frames("start"))
+
+    assert len(sink.frames) == 10
+    assert sink.closed
+    assert bus.subscriptions == []
+
+
+def test_publish_returns_when_sink_flush_fails():
+    bus, sink = asyncio.run(publish_frames("flush"))
+
+    assert len(sink.frames) == 10
+    assert sink.closed
+    assert bus.subscriptions == []
+
+
+def test_sink_subscription_removed_when_sink_task_ends():
+    async def run():
+        bus = FrameBus()
+
+        class ClosingSink(FailingSink):
+            async def write(self, game_id, frame):
+                raise asyncio.CancelledError
+
+        bus.attach(ClosingSink(None), max_queue_size=3)
+        await bus.publish("game", {'rfc460Timestamp': "0"})
+        await asyncio.sleep(0.01)
+        # The sink task died, publishing more than max_queue_size frames must not block
+        for i in range(10):
+            await asyncio.wait_for(bus.publish("game", {'rfc460Timestamp': str(i)}), timeout=1)
+        return bus
+
+    bus = asyncio.run(run())
+    assert bus.subscriptions == []
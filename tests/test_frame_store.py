@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+from lolesportapi import LoLEsportApi
+from utils.frame_store import FrameStore
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "json_examples")
+
+
+@pytest.fixture(scope="module")
+def frames():
+    with open(os.path.join(EXAMPLES, "LCK_get_window.json")) as window, \
+            open(os.path.join(EXAMPLES, "LCK_get_details.json")) as details:
+        return LoLEsportApi.get_merged_window_details_frames(json.load(window), json.load(details))['frames'][:12]
+
+
+def test_torn_tail_is_truncated(tmp_path, frames):
+    store = FrameStore(str(tmp_path), block_size=4)
+    with store.writer("g") as writer:
+        writer.extend(frames[:8])
+    with open(store.path("g"), 'rb') as f:
+        data = f.read()
+    # Half of the second block, as left by a crash
+    with open(store.path("g"), 'wb') as f:
+        f.write(data[:len(data) * 3 // 4])
+
+    with store.writer("g") as writer:
+        writer.extend(frames[4:])
+
+    with store.reader("g") as reader:
+        assert list(reader.iter_frames()) == frames
+
+
+def test_corrupted_header_keeps_file(tmp_path, frames):
+    store = FrameStore(str(tmp_path), block_size=4)
+    with store.writer("g") as writer:
+        writer.extend(frames[:8])
+    with open(store.path("g"), 'r+b') as f:
+        f.write(b"XXXX")
+    with open(store.path("g"), 'rb') as f:
+        corrupted = f.read()
+
+    with pytest.raises(ValueError):
+        with store.writer("g") as writer:
+            writer.extend(frames[8:])
+
+    with open(store.path("g"), 'rb') as f:
+        assert f.read() == corrupted
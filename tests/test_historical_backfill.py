@@ -0,0 +1,63 @@
+import datetime
+
+from triforce_support.historical_backfill import HistoricalBackfill, BackfillCheckpoint
+
+TODAY = datetime.datetime.utcnow().date()
+PAST = str(TODAY - datetime.timedelta(days=30))
+FUTURE = str(TODAY + datetime.timedelta(days=30))
+
+
+class FakeApi:
+    """API of a single tournament T1 ending on end_date, with the given completed events."""
+
+    def __init__(self, end_date: str, events: list):
+        self.end_date = end_date
+        self.events = events
+
+    def get_tournaments_league_related(self, league_id=None, mode="ongoing"):
+        return {'tournaments': [{'id': "T1", 'startDate': PAST, 'endDate': self.end_date}]}
+
+    def get_completed_events(self, tournament_id=None):
+        return {'schedule': {'events': [{'match': {'id': match_id}} for match_id in self.events]}}
+
+    def get_event_details(self, match_id):
+        return {'event': {'match': {'games': [{'id': f"{match_id}-g1", 'state': "completed"}]}}}
+
+    def request(self, url, params, live_stats_data=False, raise_errors=False):
+        # Games without live stats
+        return None
+
+
+class MemorySink:
+
+    def __init__(self):
+        self.events = []
+
+    def save_event(self, match_id, event_details):
+        self.events.append(match_id)
+
+    def save_game(self, game_id, match_id, game_metadata, frames):
+        pass
+
+
+def run_backfill(tmp_path, end_date: str, events: list) -> set:
+    path = str(tmp_path / "checkpoint.txt")
+    backfill = HistoricalBackfill(FakeApi(end_date, events), MemorySink(), BackfillCheckpoint(path), max_workers=2)
+    backfill.run()
+    return BackfillCheckpoint(path).finished
+
+
+def test_tournament_without_completed_events_not_checkpointed(tmp_path):
+    assert run_backfill(tmp_path, FUTURE, []) == set()
+
+
+def test_in_progress_tournament_only_checkpoints_its_games(tmp_path):
+    finished = run_backfill(tmp_path, FUTURE, ["M1"])
+
+    assert finished == {"game:M1-g1", "event:M1"}
+
+
+def test_ended_tournament_checkpointed(tmp_path):
+    finished = run_backfill(tmp_path, PAST, ["M1"])
+
+    assert finished == {"game:M1-g1", "event:M1", "tournament:T1"}
@@ -0,0 +1,31 @@
+import datetime
+
+from lolesportapi import LoLEsportApi
+
+PAGES = {
+    None: {'schedule': {'events': [{'id': "E3", 'startTime': "2023-06-03T10:00:00Z"},
+                                   {'id': "E4", 'startTime': "2023-06-04T10:00:00Z"}],
+                        'pages': {'older': "P1", 'newer': None}}},
+    "P1": {'schedule': {'events': [{'id': "E1", 'startTime': "2023-06-01T10:00:00Z"},
+                                   {'id': "E2", 'startTime': "2023-06-02T10:00:00Z"}],
+                        'pages': {'older': None, 'newer': None}}},
+}
+
+
+def schedule_ids(**bounds) -> list:
+    api = LoLEsportApi()
+    api.get_schedule = lambda hl=None, league_id=None, pagetoken=None: PAGES[pagetoken]
+    return [event['id'] for event in api.iter_schedule(**bounds)]
+
+
+def test_aware_bounds():
+    # 2023-06-02T12:00 and 2023-06-04T12:00 UTC
+    tz = datetime.timezone(datetime.timedelta(hours=2))
+    since = datetime.datetime(2023, 6, 2, 14, tzinfo=tz)
+    until = datetime.datetime(2023, 6, 4, 14, tzinfo=tz)
+
+    assert schedule_ids(since=since, until=until) == ["E4", "E3"]
+
+
+def test_naive_bounds_are_utc():
+    assert schedule_ids(since=datetime.datetime(2023, 6, 2, 10), until=datetime.date(2023, 6, 4)) == ["E3", "E2"]
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+from utils.rate_limiter import RequestScheduler, RetryPolicy, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.headers = {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    async def aclose(self):
+        self.closed = True
+
+
+def make_scheduler() -> RequestScheduler:
+    return RequestScheduler(TokenBucket(rate=1000, capacity=1000, max_rate=1000), RetryPolicy(base_delay=0))
+
+
+def test_discarded_responses_are_closed():
+    responses = [FakeResponse(503), FakeResponse(429), FakeResponse(200)]
+    sent = iter(responses)
+
+    assert make_scheduler().send(lambda: next(sent), "test") is responses[-1]
+    assert [response.closed for response in responses] == [True, True, False]
+
+
+def test_discarded_responses_are_closed_async():
+    responses = [FakeResponse(503), FakeResponse(200)]
+    sent = iter(responses)
+
+    async def send():
+        return next(sent)
+
+    assert asyncio.run(make_scheduler().send_async(send, "test")) is responses[-1]
+    assert [response.closed for response in responses] == [True, False]
+
+
+def test_counters_are_thread_safe():
+    scheduler = make_scheduler()
+
+    def send_requests():
+        for _ in range(500):
+            scheduler.send(lambda: FakeResponse(200), "test")
+
+    threads = [threading.Thread(target=send_requests) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = scheduler.stats()["test"]
+    assert stats['requests'] == 2000
+    assert stats['status_codes'] == {200: 2000}
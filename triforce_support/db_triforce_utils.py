@@ -7,6 +7,40 @@ import logging
 log = logging.getLogger(__name__)
 
 
+class RowIndex(list):
+    """List of table rows (dicts) with O(1) lookups by column value.
+
+    The index of a column is built the first time the column is looked up, and when several rows share the
+    value the first one is returned, like a linear search would.
+    """
+
+    def __init__(self, rows=()):
+        super().__init__(rows)
+        self.indexes = {}
+
+    @classmethod
+    def of(cls, rows):
+        return rows if isinstance(rows, cls) else cls(rows)
+
+    def find(self, column: str, value, default=None):
+        index = self.indexes.get(column)
+        if index is None:
+            index = {}
+            for row in self:
+                index.setdefault(row[column], row)
+            self.indexes[column] = index
+
+        return index.get(value, default)
+
+    def append(self, row):
+        super().append(row)
+        self.indexes = {}
+
+    def extend(self, rows):
+        super().extend(rows)
+        self.indexes = {}
+
+
 def create_backup_db(remote_host: bool = True):
     backup_name = "backup_triforce_" + datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ').replace(":", "_")
 
@@ -83,11 +117,11 @@ def leagues_to_sql(json):
 
 def tournaments_to_sql(json, leagues_db_rows):
     tournaments_sql_formatted = []
+    leagues_db_rows = RowIndex.of(leagues_db_rows)
     for tournament in json['tournaments']:
 
         # Retrieve related league
-        league_dict = next((league for league in leagues_db_rows
-                            if league["ext_id"] == int(tournament["league"]["id"])), None)
+        league_dict = leagues_db_rows.find("ext_id", int(tournament["league"]["id"]))
 
         if not league_dict:
             league_dict = {}
@@ -109,11 +143,11 @@ def tournaments_to_sql(json, leagues_db_rows):
 
 def teams_to_sql(teams_json: dict, leagues_db_rows):
     teams_sql_formatted = []
+    leagues_db_rows = RowIndex.of(leagues_db_rows)
     for team in teams_json['teams']:
 
         # Retrieve related league
-        league_dict = next((league for league in leagues_db_rows
-                            if (team["homeLeague"] and league["name"] == team["homeLeague"]["name"])), None)
+        league_dict = leagues_db_rows.find("name", team["homeLeague"]["name"]) if team["homeLeague"] else None
 
         if not league_dict:
             league_dict = {}
@@ -154,15 +188,15 @@ def players_to_sql(players_json: dict):
 
 def teams_players_relation_to_sql(players_json, players_sql, teams_sql):
     teams_players_relation_sql_formatted = []
+    players_sql = RowIndex.of(players_sql)
+    teams_sql = RowIndex.of(teams_sql)
 
     for player in players_json['players']:
-        player_in_db = next((p_db for p_db in players_sql
-                             if p_db["ext_id"] == int(player["id"])), None)
+        player_in_db = players_sql.find("ext_id", int(player["id"]))
         if not player_in_db:
             log.warning(f"Didnt find the player on db: {player}\nplayers db info info: {players_sql}")
         for team in player["teams"]:
-            team_in_db = next((t_db for t_db in teams_sql
-                               if t_db["ext_id"] == int(team)), None)
+            team_in_db = teams_sql.find("ext_id", int(team))
             if not team_in_db:
                 log.warning(f"Didnt find the team on db: {team}\nTeam db info info: {teams_sql}")
             team_id = team_in_db['id']
@@ -173,3 +207,48 @@ def teams_players_relation_to_sql(players_json, players_sql, teams_sql):
             teams_players_relation_sql_formatted.append(values)
 
     return teams_players_relation_sql_formatted
+
+
+def rows_to_sync(api_rows: list, db_rows: list, columns: list, key_columns: list = None):
+    """
+    Compare the rows built from the API (lists with a value for each column) with the current rows of a table
+    (dicts by column name), to only write what changed.
+
+    Parameters
+    ----------
+        api_rows : list
+             Rows in the same format used to insert them (see leagues_to_sql, teams_to_sql, etc).
+        db_rows : list
+             Current table rows as dicts, including at least the given columns.
+        columns : list
+             Column name of each value of the API rows.
+        key_columns : list
+             Columns identifying a row. "ext_id" by default.
+    Returns
+    -------
+        tuple
+        (rows of api_rows that are new or changed, keys of the db_rows that aren't on api_rows anymore)
+    """
+    if not key_columns:
+        key_columns = ["ext_id"]
+
+    def normalize(value):
+        # DB values are typed (int ids, dates) while API values are mostly strings
+        return None if value is None else str(value)
+
+    key_indexes = [columns.index(column) for column in key_columns]
+    db_rows_by_key = {tuple(normalize(db_row[column]) for column in key_columns): db_row for db_row in db_rows}
+
+    changed_rows = {}
+    for row in api_rows:
+        key = tuple(normalize(row[i]) for i in key_indexes)
+        db_row = db_rows_by_key.get(key)
+        if not db_row or any(normalize(db_row[column]) != normalize(value) for column, value in zip(columns, row)):
+            # Keyed by the row key so a duplicated API record is only written once
+            changed_rows[key] = row
+
+    api_keys = {tuple(normalize(row[i]) for i in key_indexes) for row in api_rows}
+    removed_keys = [[db_row[column] for column in key_columns] if len(key_columns) > 1 else db_row[key_columns[0]]
+                    for key, db_row in db_rows_by_key.items() if key not in api_keys]
+
+    return list(changed_rows.values()), removed_keys
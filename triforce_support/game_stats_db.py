@@ -0,0 +1,186 @@
+import logging
+import re
+import threading
+
+from utils.game_timeline import PARTICIPANT_STATS, TEAM_STATS, TEAM_SIDES
+from utils.postgres_db import Database
+
+log = logging.getLogger(__name__)
+
+
+def snake_case(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+PARTICIPANT_STAT_COLUMNS = [snake_case(stat) for stat in PARTICIPANT_STATS]
+TEAM_STAT_COLUMNS = [f"{side}_{snake_case(stat)}" for side in TEAM_SIDES for stat in TEAM_STATS]
+
+MATCH_COLUMNS = ["ext_id", "tournament_ext_id", "league_ext_id", "best_of"]
+GAME_COLUMNS = ["ext_id", "match_ext_id", "number", "state", "blue_team_ext_id", "red_team_ext_id"]
+GAME_PARTICIPANT_COLUMNS = ["game_ext_id", "participant_id", "player_ext_id", "team_ext_id", "side",
+                            "summoner_name", "champion_id", "role"]
+GAME_FRAME_COLUMNS = ["game_ext_id", "frame_time", "game_state"] + TEAM_STAT_COLUMNS
+PARTICIPANT_STAT_TABLE_COLUMNS = ["game_ext_id", "participant_id", "frame_time"] + PARTICIPANT_STAT_COLUMNS + ["items"]
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS match (ext_id BIGINT PRIMARY KEY, tournament_ext_id BIGINT, league_ext_id BIGINT, "
+    "best_of SMALLINT);",
+    "CREATE INDEX IF NOT EXISTS match_tournament_idx ON match (tournament_ext_id);",
+
+    "CREATE TABLE IF NOT EXISTS game (ext_id BIGINT PRIMARY KEY, match_ext_id BIGINT REFERENCES match (ext_id), "
+    "number SMALLINT, state TEXT, blue_team_ext_id BIGINT, red_team_ext_id BIGINT, patch_version TEXT, "
+    "start_time TIMESTAMPTZ);",
+    "CREATE INDEX IF NOT EXISTS game_match_idx ON game (match_ext_id);",
+
+    "CREATE TABLE IF NOT EXISTS game_participant (game_ext_id BIGINT, participant_id SMALLINT, "
+    "player_ext_id BIGINT, team_ext_id BIGINT, side TEXT, summoner_name TEXT, champion_id TEXT, role TEXT, "
+    "PRIMARY KEY (game_ext_id, participant_id));",
+    # "Stats of a player over a tournament": player -> games -> stats of its participant on those games
+    "CREATE INDEX IF NOT EXISTS game_participant_player_idx ON game_participant (player_ext_id, game_ext_id);",
+
+    # Frame tables are partitioned by month of the frame time (the game date)
+    "CREATE TABLE IF NOT EXISTS game_frame (game_ext_id BIGINT, frame_time TIMESTAMPTZ, game_state TEXT, "
+    + ", ".join(f"{column} INTEGER" for column in TEAM_STAT_COLUMNS)
+    + ", PRIMARY KEY (game_ext_id, frame_time)) PARTITION BY RANGE (frame_time);",
+
+    "CREATE TABLE IF NOT EXISTS participant_stat (game_ext_id BIGINT, participant_id SMALLINT, "
+    "frame_time TIMESTAMPTZ, "
+    + ", ".join(f"{column} DOUBLE PRECISION" for column in PARTICIPANT_STAT_COLUMNS)
+    + ", items INTEGER[], PRIMARY KEY (game_ext_id, participant_id, frame_time)) PARTITION BY RANGE (frame_time);"
+]
+
+
+def month_bounds(month: str) -> tuple:
+    """(start of the month, start of the next month) of a "YYYY-MM" month, as UTC timestamps. The offset is
+    explicit because months are taken from the UTC rfc460Timestamp, and bounds without offset would be read in the
+    session time zone."""
+    year, month_number = int(month[:4]), int(month[5:7])
+    next_year, next_month = (year + 1, 1) if month_number == 12 else (year, month_number + 1)
+    return f"{year:04d}-{month_number:02d}-01 00:00:00+00", f"{next_year:04d}-{next_month:02d}-01 00:00:00+00"
+
+
+class GameStatsWriter:
+    """Writes events, games, participants and merged frames (see LoLEsportApi.get_merged_window_details_frames)
+    on the normalized game stats tables. Every write is an upsert, so data can be written again (e.g. the frames of
+    a live game on each poll).
+
+    It has the interface of the historical backfill sinks, so it can archive a backfill.
+
+    Usage
+    -----
+        writer = GameStatsWriter(Database("triforce"))
+        writer.create_tables()
+        writer.save_event(match_id, api.get_event_details(match_id))
+        writer.save_game(game_id, match_id, window['gameMetadata'], merged_frames)
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self.partitions = frozenset()
+        self.lock = threading.Lock()
+
+    def create_tables(self):
+        with self.database.transaction():
+            for stmt in SCHEMA:
+                self.database.query(stmt)
+
+    def ensure_partitions(self, months):
+        """Create the game_frame/participant_stat partitions of the months ("YYYY-MM") that don't have one.
+
+        Partitions are created on their own short transaction (and pooled connection), so they're committed even if
+        the transaction of the caller is rolled back, and the lock they take on the partitioned tables isn't held
+        until the caller commits. The caller must not have written on game_frame or participant_stat in its
+        transaction, as the partitions would wait for it."""
+        months = set(months)
+        # partitions is replaced instead of updated, so it can be read without the lock
+        if months <= self.partitions:
+            return
+
+        with self.lock:
+            new_months = sorted(months - self.partitions)
+            if not new_months:
+                return
+
+            with self.database.transaction(independent=True):
+                for month in new_months:
+                    start, end = month_bounds(month)
+                    suffix = month.replace("-", "_")
+                    for table in ("game_frame", "participant_stat"):
+                        self.database.query(f"CREATE TABLE IF NOT EXISTS {table}_{suffix} PARTITION OF {table} "
+                                            f"FOR VALUES FROM ('{start}') TO ('{end}');")
+            self.partitions = self.partitions | set(new_months)
+
+    def save_event(self, match_id: str, event_details: dict):
+        """Upsert the match and its games from a get_event_details response."""
+        event = event_details['event']
+        match = event['match']
+
+        match_row = [match_id, event.get('tournament', {}).get('id'), event.get('league', {}).get('id'),
+                     match.get('strategy', {}).get('count')]
+
+        game_rows = []
+        for game in match['games']:
+            sides = {team['side']: team['id'] for team in game.get('teams', [])}
+            game_rows.append([game['id'], match_id, game['number'], game['state'], sides.get('blue'),
+                              sides.get('red')])
+
+        with self.database.transaction():
+            self.database.upsert_rows("match", MATCH_COLUMNS, [match_row])
+            self.database.upsert_rows("game", GAME_COLUMNS, game_rows)
+
+    def save_game_metadata(self, game_id: str, game_metadata: dict):
+        """Upsert the participants of a game and its patch version, from the gameMetadata of a window response."""
+        participant_rows = []
+        for side in TEAM_SIDES:
+            team_metadata = game_metadata[f'{side}TeamMetadata']
+            for participant in team_metadata['participantMetadata']:
+                participant_rows.append([game_id, participant['participantId'], participant.get('esportsPlayerId'),
+                                         team_metadata['esportsTeamId'], side, participant.get('summonerName'),
+                                         participant.get('championId'), participant.get('role')])
+
+        with self.database.transaction():
+            self.database.upsert_rows("game_participant", GAME_PARTICIPANT_COLUMNS, participant_rows,
+                                      conflict_columns=["game_ext_id", "participant_id"])
+            self.database.query("UPDATE game SET patch_version = %s WHERE ext_id = %s;",
+                                (game_metadata.get('patchVersion'), game_id))
+
+    def save_frames(self, game_id: str, frames: list):
+        """Upsert the team stats of each merged frame and the stats of each participant on it."""
+        if not frames:
+            return
+
+        frame_rows = []
+        stat_rows = []
+        for frame in frames:
+            frame_time = frame['rfc460Timestamp']
+            team_values = []
+            for side in TEAM_SIDES:
+                team = frame.get(side) or {}
+                for stat in TEAM_STATS:
+                    value = team.get(stat)
+                    team_values.append(len(value) if stat == "dragons" and value is not None else value)
+
+                for player in team.get('participants', []):
+                    stat_rows.append([game_id, player['participantId'], frame_time]
+                                     + [player.get(stat) for stat in PARTICIPANT_STATS]
+                                     + [player.get('items')])
+
+            frame_rows.append([game_id, frame_time, frame['gameState']] + team_values)
+
+        self.ensure_partitions({frame['rfc460Timestamp'][:7] for frame in frames})
+        with self.database.transaction():
+            self.database.upsert_rows("game_frame", GAME_FRAME_COLUMNS, frame_rows,
+                                      conflict_columns=["game_ext_id", "frame_time"])
+            self.database.upsert_rows("participant_stat", PARTICIPANT_STAT_TABLE_COLUMNS, stat_rows,
+                                      conflict_columns=["game_ext_id", "participant_id", "frame_time"])
+            # LEAST ignores NULL, so the first saved frames set the start time
+            self.database.query("UPDATE game SET start_time = LEAST(start_time, %s) WHERE ext_id = %s;",
+                                (min(frame['rfc460Timestamp'] for frame in frames), game_id))
+        log.info(f"Saved {len(frame_rows)} frames of game {game_id}")
+
+    def save_game(self, game_id: str, match_id: str, game_metadata: dict, frames: list):
+        """Save the participants and frames of a game, see save_game_metadata and save_frames."""
+        with self.database.transaction():
+            if game_metadata:
+                self.save_game_metadata(game_id, game_metadata)
+            self.save_frames(game_id, frames)
@@ -0,0 +1,289 @@
+import argparse
+import datetime
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import root_dir, LIVE_STATS_API
+from lolesportapi import LoLEsportApi
+from live_tracker import GameCursor
+from triforce_support.game_stats_db import GameStatsWriter
+from triforce_support.parallel_transforms import ParallelTransforms
+from utils import json_backend
+from utils.postgres_db import Database
+from utils.triforce_logging_configs import enable_logging
+
+log = logging.getLogger(__name__)
+
+
+class BackfillCheckpoint:
+    """Append-only file with the keys of the finished backfill units (e.g. "game:<id>"), one per line.
+    Keys are written as soon as the unit is finished, so an interrupted backfill resumes without refetching them."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.finished = set()
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.finished = {line.strip() for line in f if line.strip()}
+            log.info(f"Loaded {len(self.finished)} finished units from checkpoint {path}")
+
+    def is_done(self, key: str) -> bool:
+        return key in self.finished
+
+    def mark_done(self, key: str):
+        with self.lock:
+            if key in self.finished:
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(key + "\n")
+            self.finished.add(key)
+
+
+class DiskBackfillSink:
+    """Saves each event details and game timeline as a JSON file on relative_path (relative to root_dir).
+
+    Write errors are raised (unlike save_data, which only logs them), so the unit isn't recorded as finished.
+    """
+
+    def __init__(self, relative_path: str = "backfill"):
+        self.directory = f'{root_dir}/{relative_path.strip("/")}'
+        os.makedirs(self.directory, exist_ok=True)
+
+    def write(self, file: str, data):
+        # Written on a temporary file and renamed, so a crash never leaves a partial file
+        path = f"{self.directory}/{file}.json"
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(json_backend.dumps(data, indent=True))
+        os.replace(path + ".tmp", path)
+        log.info(f"Saved data on {path}")
+
+    def save_event(self, match_id: str, event_details: dict):
+        self.write(f"event_{match_id}", event_details)
+
+    def save_game(self, game_id: str, match_id: str, game_metadata: dict, frames: list):
+        self.write(f"game_{game_id}", {'esportsGameId': game_id, 'esportsMatchId': match_id,
+                                       'gameMetadata': game_metadata, 'frames': frames})
+
+
+class PostgresBackfillSink:
+    """Saves each event details and game timeline as a jsonb row of the backfill_event/backfill_game tables."""
+
+    def __init__(self, database: Database):
+        self.database = database
+
+    def create_tables(self):
+        self.database.query("CREATE TABLE IF NOT EXISTS backfill_event (ext_id BIGINT PRIMARY KEY, data JSONB);")
+        self.database.query("CREATE TABLE IF NOT EXISTS backfill_game (ext_id BIGINT PRIMARY KEY, "
+                            "match_ext_id BIGINT, game_metadata JSONB, frames JSONB);")
+
+    def save_event(self, match_id: str, event_details: dict):
+        self.database.upsert_rows("backfill_event", ["ext_id", "data"], [[match_id, json_backend.dumps(event_details)]])
+
+    def save_game(self, game_id: str, match_id: str, game_metadata: dict, frames: list):
+        self.database.upsert_rows("backfill_game", ["ext_id", "match_ext_id", "game_metadata", "frames"],
+                                  [[game_id, match_id, json_backend.dumps(game_metadata), json_backend.dumps(frames)]])
+
+
+class HistoricalBackfill:
+    """Archives the completed games of tournaments: tournaments -> completed events -> games -> full window/details
+    timelines (merged frames).
+
+    Games are fetched by up to max_workers threads. Every finished game, event and tournament is recorded on the
+    checkpoint, so running the backfill again skips everything already archived. With transforms, the frames of
+    each game are merged on its process pool instead of on the game thread.
+    """
+
+    def __init__(self, api: LoLEsportApi, sink, checkpoint: BackfillCheckpoint, max_workers: int = 8,
+                 max_windows: int = 600, transforms: ParallelTransforms = None):
+        self.api = api
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.max_workers = max_workers
+        # Safety limit of windows (10 seconds each) requested per game
+        self.max_windows = max_windows
+        self.transforms = transforms
+
+    def get_tournament_end_dates(self, league_ids: list = None) -> dict:
+        """endDate ("YYYY-MM-DD") of every tournament of the leagues (all leagues if None), keyed by tournament id.
+        Empty if the tournaments couldn't be retrieved."""
+        league_id = ",".join(league_ids) if league_ids else None
+        tournaments = self.api.get_tournaments_league_related(league_id=league_id, mode="all")
+        if not tournaments:
+            log.warning("Tournaments not retrieved, no tournament will be recorded as finished")
+            return {}
+
+        return {tournament['id']: tournament['endDate'] for tournament in tournaments['tournaments']}
+
+    def request_live_stats(self, endpoint: str, game_id: str, starting_time: str = None):
+        """Live stats window/details of a game. None if the API has no content for it, a failed request raises
+        (LoLEsportResponseError/LoLEsportStructureError), so the game isn't recorded as finished."""
+        return self.api.request(LIVE_STATS_API + f'/{endpoint}/{game_id}', params={'startingTime': starting_time},
+                                live_stats_data=True, raise_errors=True)
+
+    def fetch_game_frames(self, game_id: str):
+        """Request every window/details of a completed game from its first frame until it's finished.
+
+            Returns
+             -------
+            tuple
+                (gameMetadata, merged frames). (None, []) if the game has no live stats.
+        """
+        # Without startingTime the live stats API returns the first frames of the game
+        first_window = self.request_live_stats("window", game_id)
+        if not first_window or not first_window.get('frames'):
+            return None, []
+
+        first_timestamp = first_window['frames'][0]['rfc460Timestamp']
+        # Valid window times must be evenly divisible by 10 seconds
+        starting_time = first_timestamp[:18] + "0Z"
+        cursor = GameCursor(game_id, starting_time=starting_time)
+
+        frames = []
+        window_frames, details_frames = [], []
+        for _ in range(self.max_windows):
+            window = self.request_live_stats("window", game_id, cursor.starting_time)
+            details = self.request_live_stats("details", game_id, cursor.starting_time)
+
+            if window and window.get('frames'):
+                new_frames = cursor.new_frames(window['frames'])
+                if self.transforms:
+                    window_frames.extend(new_frames)
+                    details_frames.extend(details['frames'] if details else [])
+                else:
+                    frames.extend(self.api.iter_merged_window_details_frames(
+                        new_frames, details['frames'] if details else []))
+
+                if any(frame['gameState'] == "finished" for frame in new_frames):
+                    break
+            elif frames or window_frames:
+                # No more content after the last frame
+                break
+
+            cursor.advance()
+        else:
+            log.warning(f"Game {game_id} not finished after {self.max_windows} windows")
+
+        if self.transforms:
+            frames = self.transforms.merged_frames_for_games({game_id: (window_frames, details_frames)})[game_id]
+
+        return first_window.get('gameMetadata'), frames
+
+    def backfill_game(self, game_id: str, match_id: str):
+        key = f"game:{game_id}"
+        if self.checkpoint.is_done(key):
+            return
+
+        game_metadata, frames = self.fetch_game_frames(game_id)
+        if frames:
+            self.sink.save_game(game_id, match_id, game_metadata, frames)
+        else:
+            log.warning(f"Game {game_id} of match {match_id} without live stats")
+        self.checkpoint.mark_done(key)
+        log.info(f"Game {game_id} archived ({len(frames)} frames)")
+
+    def backfill_tournament(self, tournament_id: str, executor: ThreadPoolExecutor, end_date: str = None):
+        """Archive the completed events of a tournament. The tournament is only recorded as finished if every event
+        was archived and it ended (end_date before today), otherwise the next run requests its events again and
+        only archives the ones not recorded yet."""
+        key = f"tournament:{tournament_id}"
+        if self.checkpoint.is_done(key):
+            return
+
+        completed_events = self.api.get_completed_events(tournament_id=tournament_id)
+        if not completed_events:
+            log.warning(f"Completed events of tournament {tournament_id} not retrieved")
+            return
+
+        # The tournament is only recorded as finished if every event is
+        tournament_finished = True
+        events_games = {}
+        for event in completed_events['schedule']['events']:
+            match_id = event['match']['id']
+            if self.checkpoint.is_done(f"event:{match_id}"):
+                continue
+
+            event_details = self.api.get_event_details(match_id)
+            if not event_details:
+                log.warning(f"Event details of match {match_id} not retrieved")
+                tournament_finished = False
+                continue
+            try:
+                self.sink.save_event(match_id, event_details)
+            except Exception:
+                log.exception(f"Error saving the event of match {match_id}")
+                tournament_finished = False
+                continue
+
+            games = [game for game in event_details['event']['match']['games'] if game['state'] == "completed"]
+            events_games[match_id] = [executor.submit(self.backfill_game, game['id'], match_id) for game in games]
+
+        for match_id, futures in events_games.items():
+            try:
+                for future in futures:
+                    future.result()
+                self.checkpoint.mark_done(f"event:{match_id}")
+            except Exception:
+                tournament_finished = False
+                log.exception(f"Error archiving the games of match {match_id}")
+
+        if not tournament_finished:
+            log.warning(f"Tournament {tournament_id} partially archived, the missing events are retried next run")
+        elif end_date and end_date < datetime.datetime.utcnow().strftime("%Y-%m-%d"):
+            self.checkpoint.mark_done(key)
+            log.info(f"Tournament {tournament_id} archived")
+        else:
+            log.info(f"Completed events of tournament {tournament_id} archived, it hasn't ended yet")
+
+    def run(self, tournament_ids: list = None, league_ids: list = None):
+        end_dates = self.get_tournament_end_dates(league_ids)
+        if not tournament_ids:
+            tournament_ids = list(end_dates)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for tournament_id in tournament_ids:
+                try:
+                    self.backfill_tournament(tournament_id, executor, end_date=end_dates.get(tournament_id))
+                except Exception:
+                    log.exception(f"Error archiving tournament {tournament_id}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive the completed games of lolesports tournaments.")
+    parser.add_argument("--tournaments", nargs="*", help="Tournament ids. All tournaments of the leagues if omitted.")
+    parser.add_argument("--leagues", nargs="*", help="League ids. All leagues if omitted.")
+    parser.add_argument("--output", default="backfill", help="Folder (relative to the project) for the JSON files.")
+    parser.add_argument("--postgres", metavar="DB_NAME", help="Save on this Postgres database instead of files.")
+    parser.add_argument("--normalized", action="store_true",
+                        help="With --postgres, save on the normalized game stats tables instead of jsonb rows.")
+    parser.add_argument("--checkpoint", default=f"{root_dir}/backfill_checkpoint.txt")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--transform-processes", type=int, default=0,
+                        help="Merge the frames of the games on this many processes. On the game threads if 0.")
+    args = parser.parse_args()
+
+    if args.postgres:
+        # A connection for each game thread, one for the events saved by the main thread and one for the partitions
+        # created by a game thread. The pool raises instead of waiting when it's exhausted.
+        database = Database(args.postgres, max_connections=args.workers + 2)
+        sink = GameStatsWriter(database) if args.normalized else PostgresBackfillSink(database)
+        sink.create_tables()
+    else:
+        sink = DiskBackfillSink(args.output)
+
+    transforms = ParallelTransforms(max_workers=args.transform_processes) if args.transform_processes else None
+    backfill = HistoricalBackfill(LoLEsportApi(), sink, BackfillCheckpoint(args.checkpoint),
+                                  max_workers=args.workers, transforms=transforms)
+    try:
+        backfill.run(tournament_ids=args.tournaments, league_ids=args.leagues)
+    finally:
+        if transforms:
+            transforms.close()
+
+
+if __name__ == "__main__":
+    enable_logging(True)
+    main()
@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from lolesportapi import LoLEsportApi
+from utils.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+def players_of_teams(teams: list, keep_teams: bool = True) -> list:
+    return list(LoLEsportApi.iter_players_from_teams(teams, keep_teams=keep_teams))
+
+
+def merged_frames(window_frames: list, details_frames: list) -> list:
+    return list(LoLEsportApi.iter_merged_window_details_frames(window_frames, details_frames))
+
+
+# Transforms that can run on the worker processes, by name
+TRANSFORMS = {
+    "teams_from_standings": LoLEsportApi.teams_from_standings,
+    "players_of_teams": players_of_teams,
+    "merged_frames": merged_frames,
+}
+
+
+def run_transform(name: str, arguments: tuple):
+    """Entry point of the worker processes. Arguments and results are pickled, which keeps the objects shared by the
+    merged frames (e.g. the details participants) shared instead of copying them as JSON would."""
+    return TRANSFORMS[name](*arguments)
+
+
+class ParallelTransforms:
+    """Runs the pure-Python transforms of the API responses on a process pool, so big payloads use every core
+    instead of one: standings by tournament, getTeams players by chunk of chunk_size teams and merged frames by game.
+    Results are merged in input order, so they are the same as the ones of the sequential transforms.
+
+    The transforms are linear, so a shard costs about as much to transfer to and from a worker as to transform:
+    the pool only pays off with spare cores and shards big enough to amortize it (whole games of frames, hundreds
+    of teams). Measure with the benchmarks before enabling it.
+
+    With max_workers=1 the transforms run on the calling process without serialization. The pool is created on the
+    first call and can be shared by threads, e.g. the game threads of a backfill submitting one game each.
+
+    Usage
+    -----
+        with ParallelTransforms(max_workers=8) as transforms:
+            teams = transforms.teams_for_tournaments(api.gather_standings(tournament_ids))
+            players = transforms.players_from_teams(api.get_teams())
+    """
+
+    def __init__(self, max_workers: int = None, chunk_size: int = 100):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Teams per players_from_teams shard
+        self.chunk_size = chunk_size
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if self.executor:
+                self.executor.shutdown()
+                self.executor = None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                log.info(f"Starting transforms process pool with {self.max_workers} workers")
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+
+    def map(self, name: str, arguments: list) -> list:
+        """Run the transform name for each arguments tuple and return the results in the same order."""
+        with metrics.timer("transform_seconds", transform=name):
+            if self.max_workers <= 1:
+                return [TRANSFORMS[name](*args) for args in arguments]
+
+            executor = self.get_executor()
+            futures = [executor.submit(run_transform, name, args) for args in arguments]
+            return [future.result() for future in futures]
+
+    def teams_for_tournaments(self, standings_by_tournament: dict, simplify_data_mode: bool = False) -> dict:
+        """Result of LoLEsportApi.teams_from_standings of each tournament, one shard per tournament.
+
+            Parameters
+            ----------
+            standings_by_tournament : dict
+                getStandings response of each tournament keyed by tournament id (see gather_standings). Tournaments
+                without response are left out.
+
+            Returns
+             -------
+            dict
+                Participating teams keyed by tournament id.
+        """
+        tournament_ids = [tournament_id for tournament_id, standings in standings_by_tournament.items() if standings]
+        results = self.map("teams_from_standings", [(standings_by_tournament[tournament_id]['standings'],
+                                                     simplify_data_mode) for tournament_id in tournament_ids])
+
+        return dict(zip(tournament_ids, results))
+
+    def players_from_teams(self, data: dict, keep_teams: bool = True) -> dict:
+        """Same result as LoLEsportApi.players_from_teams, processing the teams by chunks. Players of more than one
+        chunk keep the data of their first team and get the teams of every chunk, in order."""
+        teams = data['teams']
+        chunks = [teams[i:i + self.chunk_size] for i in range(0, len(teams), self.chunk_size)]
+
+        players = {}
+        for chunk_players in self.map("players_of_teams", [(chunk, keep_teams) for chunk in chunks]):
+            for player in chunk_players:
+                player_data = players.get(player['id'])
+                if player_data is None:
+                    players[player['id']] = player
+                elif keep_teams:
+                    player_data['teams'].extend(player['teams'])
+
+        return {'players': list(players.values())}
+
+    def merged_frames_for_games(self, games: dict) -> dict:
+        """Merged frames (see LoLEsportApi.iter_merged_window_details_frames) of each game, one shard per game.
+
+            Parameters
+            ----------
+            games : dict
+                (window frames, details frames) of each game keyed by game id.
+
+            Returns
+             -------
+            dict
+                List of merged frames keyed by game id.
+        """
+        results = self.map("merged_frames", [(window_frames, details_frames)
+                                             for window_frames, details_frames in games.values()])
+
+        return dict(zip(games, results))
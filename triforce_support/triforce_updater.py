@@ -1,29 +1,49 @@
 import logging
 
+from utils.metrics import metrics
 from utils.postgres_db import Database
+from utils.stage_scheduler import StageScheduler
 from lolesportapi import LoLEsportApi
+from triforce_support.parallel_transforms import ParallelTransforms
 import triforce_support.db_triforce_utils as triforce_utils
 
 log = logging.getLogger(__name__)
 
+LEAGUE_COLUMNS = ["ext_id", "slug", "name", "region", "image_url"]
+TOURNAMENT_COLUMNS = ["ext_id", "slug", "start_date", "end_date", "league"]
+TEAM_COLUMNS = ["ext_id", "slug", "name", "code", "image_url", "alt_image_url", "bg_image_url", "home_league"]
+PLAYER_COLUMNS = ["ext_id", "first_name", "last_name", "summoner_name", "image_url", "role"]
+TEAM_PLAYER_COLUMNS = ["team_id", "player_id"]
+
+
+def required_data(data, name: str):
+    """Return the data of an API request, raising ValueError if it wasn't retrieved (the API methods log the
+    error and return None)."""
+    if not data:
+        raise ValueError(f"API {name} data not retrieved")
+    return data
+
 
 class TriforceUpdater:
 
-    def __init__(self, db_is_remote: bool, enable_backup: bool):
+    def __init__(self, db_is_remote: bool, enable_backup: bool, max_workers: int = 4,
+                 transforms: ParallelTransforms = None):
         self.last_completed_update = None
         self.next_planned_update = None
         self.db_is_remote = db_is_remote
         self.enable_backup = enable_backup
         self.database = Database("triforce")
+        # Threads running the API requests and transforms of an update
+        self.max_workers = max_workers
+        # Optional process pool for the players transform
+        self.transforms = transforms
 
     def update_leagues_table(self, rows_to_insert):
-        self.database.insert_rows("league",
-                                  ["ext_id", "slug", "name", "region", "image_url"],
-                                  rows_to_insert)
+        self.database.insert_rows("league", LEAGUE_COLUMNS, rows_to_insert)
 
     def get_leagues_table_rows(self):
         leagues_results = self.database.get("league")
-        leagues_database_rows_dict = []
+        leagues_database_rows_dict = triforce_utils.RowIndex()
         for league in leagues_results:
             league_dict = {
                 "id": league[0],
@@ -38,19 +58,14 @@ class TriforceUpdater:
         return leagues_database_rows_dict
 
     def update_tournaments_table(self, rows_to_insert):
-        self.database.insert_rows("tournament",
-                                  ["ext_id", "slug", "start_date", "end_date", "league"],
-                                  rows_to_insert)
+        self.database.insert_rows("tournament", TOURNAMENT_COLUMNS, rows_to_insert)
 
     def update_teams_table(self, rows_to_insert):
-        self.database.insert_rows("team",
-                                  ["ext_id", "slug", "name", "code",
-                                   "image_url", "alt_image_url", "bg_image_url", "home_league"],
-                                  rows_to_insert)
+        self.database.insert_rows("team", TEAM_COLUMNS, rows_to_insert)
 
     def get_teams_table_rows(self):
         teams_results = self.database.get("team")
-        teams_database_rows_dict = []
+        teams_database_rows_dict = triforce_utils.RowIndex()
         for team in teams_results:
             team_dict = {
                 "id": team[0],
@@ -67,13 +82,11 @@ class TriforceUpdater:
         return teams_database_rows_dict
 
     def update_players_table(self, rows_to_insert):
-        self.database.insert_rows("player",
-                                  ["ext_id", "first_name", "last_name", "summoner_name", "image_url", "role"],
-                                  rows_to_insert)
+        self.database.insert_rows("player", PLAYER_COLUMNS, rows_to_insert)
 
     def get_players_table_rows(self):
         players_results = self.database.get("player")
-        players_database_rows_dict = []
+        players_database_rows_dict = triforce_utils.RowIndex()
         for player in players_results:
             player_dict = {
                 "id": player[0],
@@ -89,84 +102,164 @@ class TriforceUpdater:
         return players_database_rows_dict
 
     def update_teams_players_table(self, rows_to_insert):
-        self.database.insert_rows("team_player",
-                                  ["team_id", "player_id"],
-                                  rows_to_insert)
-
-    def truncate_triforce_tables(self):
-        self.database.query("TRUNCATE league, tournament, team, player, team_player RESTART IDENTITY;")
+        self.database.insert_rows("team_player", TEAM_PLAYER_COLUMNS, rows_to_insert)
 
-    def update_triforce(self, api: LoLEsportApi):
+    def get_table_rows(self, table: str, columns: list) -> list:
+        """Rows of a table as dicts with the given columns."""
+        return triforce_utils.RowIndex(dict(zip(columns, row)) for row in self.database.get(table, columns))
 
-        if self.enable_backup:
-            db_backup_name = triforce_utils.create_backup_db(remote_host=self.db_is_remote)
+    def sync_table_rows(self, table: str, columns: list, rows: list, key_columns: list = None) -> list:
+        """Write only the new or changed rows of a table, keeping the id of the existing ones.
 
-        api_leagues_dict = api.get_leagues()
+        Rows are matched by key_columns (ext_id by default). Rows on the table that aren't on rows are not deleted
+        here, their keys are returned so they can be deleted once nothing references them.
+        """
+        if not key_columns:
+            key_columns = ["ext_id"]
 
-        api_tournaments_dict = api.get_tournaments_league_related(mode="not_ended")
+        db_rows = self.get_table_rows(table, columns)
+        changed_rows, removed_keys = triforce_utils.rows_to_sync(rows, db_rows, columns, key_columns)
+        log.info(f"Sync {table}: {len(changed_rows)} new or changed rows, {len(removed_keys)} removed rows")
 
-        api_teams_dict = api.get_teams(only_active=True)
+        if changed_rows:
+            if set(key_columns) == set(columns):
+                # Rows without other columns than the key can only be new
+                self.database.insert_rows(table, columns, changed_rows)
+            else:
+                self.database.upsert_rows(table, columns, changed_rows, conflict_columns=key_columns)
 
-        api_players_dict = api.get_players()
+        return removed_keys
 
-        # Truncate all data on tables
-        self.truncate_triforce_tables()
+    def truncate_triforce_tables(self):
+        self.database.query("TRUNCATE league, tournament, team, player, team_player RESTART IDENTITY;")
 
-        # Riot api leagues data to SQL insert query
-        leagues_sql_formatted = triforce_utils.leagues_to_sql(api_leagues_dict)
+    def add_api_stages(self, scheduler: StageScheduler, api: LoLEsportApi):
+        """Add the API requests and the transforms of their data to SQL rows.
+
+        getTeams is requested once for both the teams and the players. The transforms needing table rows depend on
+        the "league_rows", "team_rows" and "player_rows" stages, which update_triforce and sync_triforce add.
+        """
+        scheduler.add("fetch_leagues", lambda: required_data(api.get_leagues(), "leagues"))
+        scheduler.add("fetch_tournaments",
+                      lambda: required_data(api.get_tournaments_league_related(mode="not_ended"), "tournaments"))
+        scheduler.add("fetch_teams", lambda: required_data(api.get_teams(), "teams"))
+
+        scheduler.add("active_teams", lambda teams: {'teams': [team for team in teams['teams']
+                                                               if team['status'] == "active"]},
+                      depends_on=["fetch_teams"])
+        players_from_teams = self.transforms.players_from_teams if self.transforms else LoLEsportApi.players_from_teams
+        scheduler.add("players", players_from_teams, depends_on=["fetch_teams"])
+
+        scheduler.add("leagues_sql", triforce_utils.leagues_to_sql, depends_on=["fetch_leagues"])
+        scheduler.add("tournaments_sql", triforce_utils.tournaments_to_sql,
+                      depends_on=["fetch_tournaments", "league_rows"])
+        scheduler.add("teams_sql", triforce_utils.teams_to_sql, depends_on=["active_teams", "league_rows"])
+        scheduler.add("players_sql", triforce_utils.players_to_sql, depends_on=["players"])
+        scheduler.add("team_player_sql", triforce_utils.teams_players_relation_to_sql,
+                      depends_on=["players", "player_rows", "team_rows"])
 
-        # Inserting leagues on db and retrieve the rows inserted for future operations
-        try:
-            self.update_leagues_table(leagues_sql_formatted)
+    def update_triforce(self, api: LoLEsportApi):
+        """Reload every triforce table with the API data.
 
-            leagues_table_rows = self.get_leagues_table_rows()
-        except:
-            if self.enable_backup:
-                triforce_utils.restore_data_from_backup(backup_name=db_backup_name, remote_host=self.db_is_remote)
+        The work runs as a DAG of stages (see StageScheduler): API requests and transforms run concurrently on a
+        thread pool, and each table is loaded on this thread as soon as its rows and the rows it references are
+        ready, so the refresh takes about its longest dependency chain instead of the sum of every step.
+        """
 
-        # Riot api tournaments data to SQL insert query
-        tournaments_sql_formatted = triforce_utils.tournaments_to_sql(api_tournaments_dict,
-                                                                      leagues_table_rows)
-        # Inserting tournaments on db
+        if self.enable_backup:
+            with metrics.timer("updater_phase_seconds", phase="backup"):
+                triforce_utils.create_backup_db(remote_host=self.db_is_remote)
+
+        scheduler = StageScheduler(max_workers=self.max_workers, metric="updater_phase_seconds")
+        self.add_api_stages(scheduler, api)
+
+        # Table stages use the transaction of this thread. Tables are truncated (locking them) only once every API
+        # request and every transform not needing table rows is done, so readers aren't blocked while HTTP runs.
+        scheduler.add("truncate", lambda *_: self.truncate_triforce_tables(),
+                      depends_on=["fetch_leagues", "fetch_tournaments", "fetch_teams", "leagues_sql",
+                                  "players_sql"], on_caller_thread=True)
+        scheduler.add("league_rows", lambda _, rows: self.load_leagues_table(rows),
+                      depends_on=["truncate", "leagues_sql"], on_caller_thread=True)
+        scheduler.add("load_tournaments", self.update_tournaments_table,
+                      depends_on=["tournaments_sql"], on_caller_thread=True)
+        scheduler.add("team_rows", self.load_teams_table, depends_on=["teams_sql"], on_caller_thread=True)
+        scheduler.add("player_rows", lambda _, rows: self.load_players_table(rows),
+                      depends_on=["truncate", "players_sql"], on_caller_thread=True)
+        scheduler.add("load_team_player", self.update_teams_players_table,
+                      depends_on=["team_player_sql"], on_caller_thread=True)
+
+        # Every table is reloaded on a single transaction, so if something fails (including an API request) the
+        # previous data is kept (rolled back) and readers never see the tables half loaded.
         try:
-            self.update_tournaments_table(tournaments_sql_formatted)
+            with self.database.transaction():
+                scheduler.run()
         except:
-            if self.enable_backup:
-                triforce_utils.restore_data_from_backup(backup_name=db_backup_name, remote_host=self.db_is_remote)
-
-        # Riot api teams data to SQL insert query
-        teams_sql_formatted = triforce_utils.teams_to_sql(api_teams_dict,
-                                                          leagues_table_rows)
+            log.exception("Error updating triforce, changes rolled back")
 
-        # Inserting teams on db and retrieve the rows inserted for future operations
-        try:
-            self.update_teams_table(teams_sql_formatted)
+    def load_leagues_table(self, rows_to_insert):
+        """Insert the leagues and return the table rows."""
+        self.update_leagues_table(rows_to_insert)
+        return self.get_leagues_table_rows()
 
-            teams_table_rows = self.get_teams_table_rows()
-        except:
-            if self.enable_backup:
-                triforce_utils.restore_data_from_backup(backup_name=db_backup_name, remote_host=self.db_is_remote)
+    def load_teams_table(self, rows_to_insert):
+        """Insert the teams and return the table rows."""
+        self.update_teams_table(rows_to_insert)
+        return self.get_teams_table_rows()
 
-        # Riot api players data to SQL insert query
-        players_sql_formatted = triforce_utils.players_to_sql(api_players_dict)
+    def load_players_table(self, rows_to_insert):
+        """Insert the players and return the table rows."""
+        self.update_players_table(rows_to_insert)
+        return self.get_players_table_rows()
 
-        # Inserting teams on db and retrieve the rows inserted for future operations
-        try:
-            self.update_players_table(players_sql_formatted)
+    def sync_triforce(self, api: LoLEsportApi):
+        """Incremental version of update_triforce.
 
-            players_table_rows = self.get_players_table_rows()
-        except:
-            if self.enable_backup:
-                triforce_utils.restore_data_from_backup(backup_name=db_backup_name, remote_host=self.db_is_remote)
+        Instead of truncating and reloading every table, only the new or changed rows are upserted (by ext_id) and
+        only the rows that disappeared from the API are deleted, so ids are stable and tables are never empty.
+        Stages are scheduled like on update_triforce.
+        """
 
-        # Players-teams relation to SQL insert query
-        players_team_relation_sql_formatted = triforce_utils.teams_players_relation_to_sql(api_players_dict,
-                                                                                           players_table_rows,
-                                                                                           teams_table_rows)
+        if self.enable_backup:
+            with metrics.timer("updater_phase_seconds", phase="backup"):
+                triforce_utils.create_backup_db(remote_host=self.db_is_remote)
+
+        scheduler = StageScheduler(max_workers=self.max_workers, metric="updater_phase_seconds")
+        self.add_api_stages(scheduler, api)
+
+        # Sync stages return the keys of the removed rows, see sync_table_rows
+        scheduler.add("sync_leagues", lambda rows: self.sync_table_rows("league", LEAGUE_COLUMNS, rows),
+                      depends_on=["leagues_sql"], on_caller_thread=True)
+        scheduler.add("league_rows", lambda _: self.get_leagues_table_rows(),
+                      depends_on=["sync_leagues"], on_caller_thread=True)
+        scheduler.add("sync_tournaments", lambda rows: self.sync_table_rows("tournament", TOURNAMENT_COLUMNS, rows),
+                      depends_on=["tournaments_sql"], on_caller_thread=True)
+        scheduler.add("sync_teams", lambda rows: self.sync_table_rows("team", TEAM_COLUMNS, rows),
+                      depends_on=["teams_sql"], on_caller_thread=True)
+        scheduler.add("team_rows", lambda _: self.get_teams_table_rows(),
+                      depends_on=["sync_teams"], on_caller_thread=True)
+        scheduler.add("sync_players", lambda rows: self.sync_table_rows("player", PLAYER_COLUMNS, rows),
+                      depends_on=["players_sql"], on_caller_thread=True)
+        scheduler.add("player_rows", lambda _: self.get_players_table_rows(),
+                      depends_on=["sync_players"], on_caller_thread=True)
+        scheduler.add("sync_team_player", lambda rows: self.sync_table_rows("team_player", TEAM_PLAYER_COLUMNS, rows,
+                                                                            key_columns=TEAM_PLAYER_COLUMNS),
+                      depends_on=["team_player_sql"], on_caller_thread=True)
+        scheduler.add("delete_removed", self.delete_removed_rows,
+                      depends_on=["sync_team_player", "sync_players", "sync_teams", "sync_tournaments",
+                                  "sync_leagues"],
+                      on_caller_thread=True)
 
-        # Inserting players-teams relation on db
         try:
-            self.update_teams_players_table(players_team_relation_sql_formatted)
+            with self.database.transaction():
+                scheduler.run()
         except:
-            if self.enable_backup:
-                triforce_utils.restore_data_from_backup(backup_name=db_backup_name, remote_host=self.db_is_remote)
+            log.exception("Error on incremental triforce sync, changes rolled back")
+
+    def delete_removed_rows(self, removed_relations, removed_players, removed_teams, removed_tournaments,
+                            removed_leagues):
+        # Referencing rows are deleted before the rows they reference
+        self.database.delete_rows("team_player", TEAM_PLAYER_COLUMNS, removed_relations)
+        self.database.delete_rows("player", ["ext_id"], removed_players)
+        self.database.delete_rows("team", ["ext_id"], removed_teams)
+        self.database.delete_rows("tournament", ["ext_id"], removed_tournaments)
+        self.database.delete_rows("league", ["ext_id"], removed_leagues)
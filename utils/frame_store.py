@@ -0,0 +1,333 @@
+import datetime
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+from utils import json_backend
+from utils.game_timeline import GameTimeline
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+# Block header: magic, codec, frames count, first and last frame timestamp (ms since epoch), payload length and
+# CRC32 of the payload
+BLOCK_HEADER = struct.Struct("<4sBIqqII")
+BLOCK_MAGIC = b"TFB2"
+
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# Prefix of the path segments that are list indexes
+LIST_INDEX = "#"
+
+
+def timestamp_to_ms(rfc460_timestamp: str) -> int:
+    moment = datetime.datetime.fromisoformat(rfc460_timestamp.replace("Z", "+00:00"))
+    return int(moment.timestamp() * 1000)
+
+
+def flatten_frame(value, path: str = "", columns: dict = None) -> dict:
+    """Flatten a frame to {path: value}. Dicts and lists of dicts are flattened, any other value is a leaf."""
+    if columns is None:
+        columns = {}
+
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten_frame(item, f"{path}.{key}" if path else key, columns)
+    elif isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        for i, item in enumerate(value):
+            flatten_frame(item, f"{path}.{LIST_INDEX}{i}", columns)
+    else:
+        columns[path] = value
+
+    return columns
+
+
+def unflatten_frame(columns: dict) -> dict:
+    frame = {}
+    for path, value in columns.items():
+        keys = path.split(".")
+        container = frame
+        for key, next_key in zip(keys, keys[1:]):
+            key = int(key[1:]) if key.startswith(LIST_INDEX) else key
+            default = [] if next_key.startswith(LIST_INDEX) else {}
+            if isinstance(container, list):
+                while len(container) <= key:
+                    container.append(None)
+                if container[key] is None:
+                    container[key] = default
+            else:
+                container.setdefault(key, default)
+            container = container[key]
+
+        last_key = keys[-1]
+        if last_key.startswith(LIST_INDEX):
+            index = int(last_key[1:])
+            while len(container) <= index:
+                container.append(None)
+            container[index] = value
+        else:
+            container[last_key] = value
+
+    return frame
+
+
+def encode_block(frames: list, codec: int) -> bytes:
+    """Columnar encoding of frames: a list of values per flattened path, compressed with the codec."""
+    flattened = [flatten_frame(frame) for frame in frames]
+    paths = list(dict.fromkeys(path for frame in flattened for path in frame))
+    missing = object()
+    columns = {path: [frame.get(path, missing) for frame in flattened] for path in paths}
+    # Paths missing on some frames keep the indexes of the frames that have them
+    payload = {
+        'count': len(frames),
+        'columns': {path: ({'values': values} if all(value is not missing for value in values) else
+                           {'indexes': [i for i, value in enumerate(values) if value is not missing],
+                            'values': [value for value in values if value is not missing]})
+                    for path, values in columns.items()}
+    }
+    data = json_backend.dumps(payload).encode("utf-8")
+
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def decode_block(data: bytes, codec: int) -> list:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Block compressed with zstd but the zstandard package isn't installed")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    payload = json_backend.loads(data)
+
+    frames_columns = [{} for _ in range(payload['count'])]
+    for path, column in payload['columns'].items():
+        indexes = column.get('indexes', range(payload['count']))
+        for i, value in zip(indexes, column['values']):
+            frames_columns[i][path] = value
+
+    return [unflatten_frame(columns) for columns in frames_columns]
+
+
+def scan_blocks(data):
+    """Index of the blocks of a store file.
+
+        Returns
+         -------
+        tuple
+            (blocks, end, torn): list of (first_ms, last_ms, count, codec, payload_offset, length, crc), the offset
+            where the scan stopped and whether it stopped at a block cut by the end of the file (being written or
+            torn by a crash). If end is before the end of the file and torn is False, the header at end is corrupted.
+    """
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        if offset + BLOCK_HEADER.size > len(data):
+            return blocks, offset, True
+
+        magic, codec, count, first_ms, last_ms, length, crc = BLOCK_HEADER.unpack_from(data, offset)
+        if magic != BLOCK_MAGIC:
+            return blocks, offset, False
+
+        payload_offset = offset + BLOCK_HEADER.size
+        if payload_offset + length > len(data):
+            return blocks, offset, True
+
+        blocks.append((first_ms, last_ms, count, codec, payload_offset, length, crc))
+        offset = payload_offset + length
+
+    return blocks, offset, False
+
+
+class FrameStoreWriter:
+    """Appends frames to the store file of a game as compressed blocks of up to block_size frames.
+
+    Every block is complete and independent once written, so the file can be read while the game is live and a
+    crash loses at most the frames not flushed yet: a block torn by a crash is truncated when the file is opened
+    again for writing. Frames must be appended in timestamp order.
+    """
+
+    def __init__(self, path: str, block_size: int = 60, compression: str = None):
+        if compression is None:
+            compression = "zstd" if zstandard else "zlib"
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+
+        self.path = path
+        self.block_size = block_size
+        self.codec = CODEC_ZSTD if compression == "zstd" else CODEC_ZLIB
+        self.pending_frames = []
+        self.truncate_incomplete_tail()
+
+    def truncate_incomplete_tail(self):
+        """Remove a block torn by a crash at the end of the file, so new blocks aren't appended after it: a header
+        or payload cut by the end of the file, or a last block whose payload doesn't match its CRC. Corrupted data
+        before the last block isn't a torn write and is left intact: ValueError is raised if a block header is
+        corrupted, as the blocks appended after it couldn't be read, and corrupted payloads are skipped on read."""
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return
+
+        with open(self.path, 'r+b') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                size = len(data)
+                blocks, end, torn = scan_blocks(data)
+                if end < size and not torn:
+                    raise ValueError(f"Corrupted block header at offset {end} of {self.path}, "
+                                     f"{size - end} bytes can't be read")
+                if not torn and blocks:
+                    *_, payload_offset, length, crc = blocks[-1]
+                    if zlib.crc32(data[payload_offset:payload_offset + length]) != crc:
+                        end = payload_offset - BLOCK_HEADER.size
+            if end < size:
+                log.warning(f"Truncating {size - end} bytes of incomplete block at offset {end} of {self.path}")
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def append(self, frame: dict):
+        self.pending_frames.append(frame)
+        if len(self.pending_frames) >= self.block_size:
+            self.flush()
+
+    def extend(self, frames):
+        for frame in frames:
+            self.append(frame)
+
+    def flush(self):
+        """Write the pending frames as a new block."""
+        if not self.pending_frames:
+            return
+
+        frames, self.pending_frames = self.pending_frames, []
+        payload = encode_block(frames, self.codec)
+        header = BLOCK_HEADER.pack(BLOCK_MAGIC, self.codec, len(frames),
+                                   timestamp_to_ms(frames[0]['rfc460Timestamp']),
+                                   timestamp_to_ms(frames[-1]['rfc460Timestamp']),
+                                   len(payload), zlib.crc32(payload))
+
+        with open(self.path, 'ab') as f:
+            f.write(header + payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class FrameStoreReader:
+    """Reads the store file of a game through a memory map. Only the block headers are read to build the index,
+    and only the blocks overlapping the requested timestamp range are decompressed. Blocks whose payload doesn't
+    match its CRC (or can't be decoded) are skipped with a warning."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.blocks = []
+        self.file = None
+        self.map = None
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        if self.file:
+            self.file.close()
+        self.map = None
+        self.file = None
+
+    def refresh(self):
+        """Map the file again and index its blocks, to see the blocks appended since the reader was opened."""
+        self.close()
+        self.blocks = []
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return
+
+        self.file = open(self.path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.blocks, end, torn = scan_blocks(self.map)
+        if torn:
+            # Block being written or torn by a crash
+            log.warning(f"Ignoring incomplete block at offset {end} of {self.path}")
+        elif end < len(self.map):
+            log.error(f"Corrupted block header at offset {end} of {self.path}, the following blocks can't be read")
+
+    def read_block(self, codec: int, payload_offset: int, length: int, crc) -> list:
+        """Frames of a block, [] if its payload is corrupted."""
+        payload = self.map[payload_offset:payload_offset + length]
+        if zlib.crc32(payload) != crc:
+            log.warning(f"Skipping block at offset {payload_offset} of {self.path}, payload doesn't match its CRC")
+            return []
+        try:
+            return decode_block(payload, codec)
+        except Exception:
+            log.warning(f"Skipping block at offset {payload_offset} of {self.path}, it can't be decoded",
+                        exc_info=True)
+            return []
+
+    def __len__(self):
+        return sum(block[2] for block in self.blocks)
+
+    def iter_frames(self, start: str = None, end: str = None):
+        """Generator of the frames with rfc460Timestamp between start and end (both included)."""
+        start_ms = timestamp_to_ms(start) if start else None
+        end_ms = timestamp_to_ms(end) if end else None
+
+        for first_ms, last_ms, count, codec, payload_offset, length, crc in self.blocks:
+            if (start_ms is not None and last_ms < start_ms) or (end_ms is not None and first_ms > end_ms):
+                continue
+
+            for frame in self.read_block(codec, payload_offset, length, crc):
+                frame_ms = timestamp_to_ms(frame['rfc460Timestamp'])
+                if (start_ms is not None and frame_ms < start_ms) or (end_ms is not None and frame_ms > end_ms):
+                    continue
+                yield frame
+
+    def read_timeline(self, start: str = None, end: str = None) -> GameTimeline:
+        """NumPy arrays of the merged frames (see LoLEsportApi.get_merged_window_details_frames) between start
+        and end."""
+        return GameTimeline.from_merged_frames(list(self.iter_frames(start, end)))
+
+
+class FrameStore:
+    """Directory with one compressed frame file per game.
+
+    Usage
+    -----
+        store = FrameStore(f"{root_dir}/frames")
+        with store.writer(game_id) as writer:
+            writer.extend(merged_frames)
+        with store.reader(game_id) as reader:
+            timeline = reader.read_timeline(start="2022-02-17T08:38:10Z")
+    """
+
+    def __init__(self, directory: str, block_size: int = 60, compression: str = None):
+        self.directory = directory
+        self.block_size = block_size
+        self.compression = compression
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, game_id: str) -> str:
+        return os.path.join(self.directory, f"{game_id}.frames")
+
+    def writer(self, game_id: str) -> FrameStoreWriter:
+        return FrameStoreWriter(self.path(game_id), block_size=self.block_size, compression=self.compression)
+
+    def reader(self, game_id: str) -> FrameStoreReader:
+        return FrameStoreReader(self.path(game_id))
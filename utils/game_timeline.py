@@ -0,0 +1,197 @@
+import logging
+
+import numpy as np
+
+from utils.lolesport_utilities import iter_merged_window_details_frames
+
+log = logging.getLogger(__name__)
+
+# Numeric participant stats of the window (totalGold, currentHealth, maxHealth) and details frames
+PARTICIPANT_STATS = ("totalGoldEarned", "totalGold", "creepScore", "level", "kills", "deaths", "assists",
+                     "killParticipation", "championDamageShare", "wardsPlaced", "wardsDestroyed", "attackDamage",
+                     "abilityPower", "criticalChance", "attackSpeed", "lifeSteal", "armor", "magicResistance",
+                     "tenacity", "currentHealth", "maxHealth")
+
+# Team stats of the window frames. "dragons" is the number of dragons taken.
+TEAM_STATS = ("totalGold", "inhibitors", "towers", "barons", "totalKills", "dragons")
+
+ITEM_SLOTS = 7
+
+TEAM_SIDES = ("blue", "red")
+
+
+def to_datetime64(rfc460_timestamp: str) -> np.datetime64:
+    return np.datetime64(rfc460_timestamp.rstrip("Z"), "ms")
+
+
+class GameTimeline:
+    """Columnar representation of the live stats frames of a game.
+
+    Attributes
+    ----------
+        timestamps : np.ndarray
+            datetime64[ms] array (frames) with the rfc460Timestamp of each frame.
+        game_states : np.ndarray
+            Array (frames) with the gameState of each frame.
+        participant_ids : np.ndarray
+            Array (10) with the participantId of each participant column. 1-5 blue side, 6-10 red side.
+        participant_stats : np.ndarray
+            float64 array (frames x participants x PARTICIPANT_STATS). Missing stats are NaN.
+        items : np.ndarray
+            int32 array (frames x participants x ITEM_SLOTS) with the item ids, 0 on empty slots.
+        team_stats : np.ndarray
+            float64 array (frames x 2 (blue, red) x TEAM_STATS). Missing stats are NaN.
+    """
+
+    def __init__(self, timestamps, game_states, participant_ids, participant_stats, items, team_stats):
+        self.timestamps = timestamps
+        self.game_states = game_states
+        self.participant_ids = participant_ids
+        self.participant_stats = participant_stats
+        self.items = items
+        self.team_stats = team_stats
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_frames(cls, window_frames: list, details_frames: list = None):
+        """Build the timeline from the frames of window responses and, optionally, details responses.
+
+        Details frames are joined with the window frame of the same rfc460Timestamp, and each participant gets the
+        stats of both. Repeated timestamps are only loaded once and frames are sorted by timestamp.
+
+            Parameters
+            ----------
+            window_frames : list
+                Frames of get_window responses (blueTeam, redTeam).
+            details_frames : list (optional)
+                Frames of get_details responses.
+
+            Returns
+             -------
+            GameTimeline
+        """
+        merged_frames = list(iter_merged_window_details_frames(window_frames, details_frames or [],
+                                                               combine_participants=True))
+
+        return cls.from_merged_frames(merged_frames)
+
+    @classmethod
+    def from_merged_frames(cls, merged_frames: list):
+        """Build the timeline from the frames returned by LoLEsportApi.get_merged_window_details_frames.
+
+            Parameters
+            ----------
+            merged_frames : list
+                Merged frames (rfc460Timestamp, gameState, blue, red).
+
+            Returns
+             -------
+            GameTimeline
+        """
+        frames = {}
+        for frame in merged_frames:
+            frames.setdefault(frame['rfc460Timestamp'], frame)
+        frames = [frames[timestamp] for timestamp in sorted(frames)]
+
+        participant_ids = sorted({player['participantId']
+                                  for frame in frames[:1] for side in TEAM_SIDES
+                                  for player in frame.get(side, {}).get('participants', [])})
+        participant_columns = {participant_id: i for i, participant_id in enumerate(participant_ids)}
+
+        participant_stats = np.full((len(frames), len(participant_ids), len(PARTICIPANT_STATS)), np.nan)
+        items = np.zeros((len(frames), len(participant_ids), ITEM_SLOTS), dtype=np.int32)
+        team_stats = np.full((len(frames), len(TEAM_SIDES), len(TEAM_STATS)), np.nan)
+
+        for f, frame in enumerate(frames):
+            for t, side in enumerate(TEAM_SIDES):
+                team = frame.get(side)
+                if not team:
+                    continue
+
+                for s, stat in enumerate(TEAM_STATS):
+                    value = team.get(stat)
+                    if value is not None:
+                        team_stats[f, t, s] = len(value) if stat == "dragons" else value
+
+                for player in team['participants']:
+                    p = participant_columns.get(player['participantId'])
+                    if p is None:
+                        log.warning(f"Unknown participant {player['participantId']} on frame "
+                                    f"{frame['rfc460Timestamp']}")
+                        continue
+
+                    for s, stat in enumerate(PARTICIPANT_STATS):
+                        value = player.get(stat)
+                        if value is not None:
+                            participant_stats[f, p, s] = value
+
+                    player_items = player.get('items', [])[:ITEM_SLOTS]
+                    items[f, p, :len(player_items)] = player_items
+
+        return cls(timestamps=np.array([to_datetime64(frame['rfc460Timestamp']) for frame in frames],
+                                       dtype="datetime64[ms]"),
+                   game_states=np.array([frame['gameState'] for frame in frames], dtype=object),
+                   participant_ids=np.array(participant_ids, dtype=np.int32),
+                   participant_stats=participant_stats,
+                   items=items,
+                   team_stats=team_stats)
+
+    def stat(self, name: str) -> np.ndarray:
+        """Array (frames x participants) of a participant stat."""
+        return self.participant_stats[:, :, PARTICIPANT_STATS.index(name)]
+
+    def team_stat(self, name: str) -> np.ndarray:
+        """Array (frames x 2 (blue, red)) of a team stat."""
+        return self.team_stats[:, :, TEAM_STATS.index(name)]
+
+    def elapsed_minutes(self, start=None) -> np.ndarray:
+        """Array (frames) with the minutes elapsed from start (a rfc460Timestamp) or from the first frame."""
+        if not len(self):
+            return np.zeros(0)
+        start = to_datetime64(start) if start else self.timestamps[0]
+
+        return (self.timestamps - start) / np.timedelta64(1, "m")
+
+    def gold_difference(self) -> np.ndarray:
+        """Array (frames) with the blue team gold minus the red team gold."""
+        gold = self.team_stat("totalGold")
+
+        return gold[:, 0] - gold[:, 1]
+
+    def per_minute(self, name: str, start=None) -> np.ndarray:
+        """Array (frames x participants) of a participant stat divided by the minutes elapsed from start
+        (the game start rfc460Timestamp). The frame at start is NaN."""
+        minutes = self.elapsed_minutes(start)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = self.stat(name) / minutes[:, None]
+        rates[minutes <= 0] = np.nan
+
+        return rates
+
+    def rate(self, name: str) -> np.ndarray:
+        """Array (frames x participants) with the instantaneous per minute variation of a participant stat."""
+        if len(self) < 2:
+            return np.full(self.stat(name).shape, np.nan)
+
+        return np.gradient(self.stat(name), self.elapsed_minutes(), axis=0)
+
+    def resample(self, seconds: int = 10):
+        """Return a new timeline with one frame every given seconds from the first frame, each one with the values
+        of the last frame at or before its time."""
+        if not len(self):
+            return self
+
+        step = np.timedelta64(seconds * 1000, "ms")
+        timestamps = np.arange(self.timestamps[0], self.timestamps[-1] + step, step)
+        if timestamps[-1] > self.timestamps[-1]:
+            timestamps = timestamps[:-1]
+        indexes = np.searchsorted(self.timestamps, timestamps, side="right") - 1
+
+        return GameTimeline(timestamps=timestamps,
+                            game_states=self.game_states[indexes],
+                            participant_ids=self.participant_ids,
+                            participant_stats=self.participant_stats[indexes],
+                            items=self.items[indexes],
+                            team_stats=self.team_stats[indexes])
@@ -0,0 +1,46 @@
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+
+def loads(data):
+    """Decode a JSON document (str or bytes), with orjson if it's installed."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data, indent: bool = False) -> str:
+    """Encode data as a JSON string, with orjson if it's installed. orjson only supports 2 spaces indentation, so
+    indented output uses 2 spaces with both backends."""
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=option).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=2 if indent else None,
+                      separators=None if indent else (",", ":"))
+
+
+class JsonResponse:
+    """Wrapper of a requests (or httpx) response that decodes its JSON body only once. Every other attribute is
+    read from the wrapped response."""
+
+    def __init__(self, response):
+        self.response = response
+        self.parsed = False
+        self.body = None
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def json(self):
+        """Decoded body, None if the response has no content."""
+        if not self.parsed:
+            self.body = loads(self.response.content) if self.response.content else None
+            self.parsed = True
+        return self.body
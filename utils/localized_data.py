@@ -0,0 +1,102 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+# Key of the dicts holding the value of a locale dependent field by language code
+LOCALIZED_KEY = "$localized"
+
+
+def is_localized(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and LOCALIZED_KEY in value
+
+
+def align_lists(lists_by_language: dict):
+    """Items of the lists of every language that are the same element, as a list of {language: item}.
+
+    Lists of dicts with a unique "id" are aligned by id (in the order of the first language), other lists by
+    position. Returns None if the lists can't be aligned (different ids or lengths).
+    """
+    lists = list(lists_by_language.values())
+
+    if all(isinstance(item, dict) and 'id' in item for items in lists for item in items):
+        indexes = {language: {item['id']: item for item in items} for language, items in lists_by_language.items()}
+        first_ids = [item['id'] for item in lists[0]]
+        if all(len(index) == len(first_ids) and index.keys() == set(first_ids) for index in indexes.values()):
+            return [{language: index[item_id] for language, index in indexes.items()} for item_id in first_ids]
+        return None
+
+    if all(len(items) == len(lists[0]) for items in lists):
+        return [{language: items[i] for language, items in lists_by_language.items()} for i in range(len(lists[0]))]
+    return None
+
+
+def merge_localized(values_by_language: dict):
+    """Merge the responses of the same request on several languages into one structure.
+
+    Values equal on every language (ids, dates, images...) are stored once, and only the values that differ
+    (names, blockName...) are stored by language as {"$localized": {language: value}}. Keys missing on some
+    languages are stored as localized values of the languages that have them. Use localize to get the structure of
+    a language back.
+
+        Parameters
+        ----------
+        values_by_language : dict
+            Response (or any JSON value) of each language code.
+
+        Returns
+         -------
+        Merged value.
+    """
+    values = list(values_by_language.values())
+    first = values[0]
+
+    if all(value == first for value in values[1:]):
+        return first
+
+    if all(isinstance(value, dict) for value in values):
+        keys = list(dict.fromkeys(key for value in values for key in value))
+        merged = {}
+        for key in keys:
+            present = {language: value[key] for language, value in values_by_language.items() if key in value}
+            if len(present) < len(values_by_language):
+                # Only the languages that have the key are stored, the others take the fallback language value
+                merged[key] = {LOCALIZED_KEY: present}
+            else:
+                merged[key] = merge_localized(present)
+        return merged
+
+    if all(isinstance(value, list) for value in values):
+        aligned = align_lists(values_by_language)
+        if aligned is not None:
+            return [merge_localized(items) for items in aligned]
+        log.debug("Lists with different elements by language, stored by language")
+
+    return {LOCALIZED_KEY: dict(values_by_language)}
+
+
+def localize(merged, language: str, fallback_language: str = "en-US"):
+    """Structure of a language from a merge_localized result. Values missing on the language take the value of
+    fallback_language."""
+    if is_localized(merged):
+        values = merged[LOCALIZED_KEY]
+        value = values[language] if language in values else values.get(fallback_language)
+        return localize(value, language, fallback_language)
+
+    if isinstance(merged, dict):
+        return {key: localize(value, language, fallback_language) for key, value in merged.items()}
+
+    if isinstance(merged, list):
+        return [localize(value, language, fallback_language) for value in merged]
+
+    return merged
+
+
+def localized_languages(merged) -> set:
+    """Languages with at least one localized value on a merge_localized result."""
+    if is_localized(merged):
+        return set(merged[LOCALIZED_KEY])
+    if isinstance(merged, dict):
+        return set().union(*[localized_languages(value) for value in merged.values()])
+    if isinstance(merged, list):
+        return set().union(*[localized_languages(value) for value in merged])
+    return set()
@@ -30,6 +30,30 @@ def get_valid_date() -> str:
     return now_string
 
 
+def advance_window_date(valid_datetime: str, seconds: int = 10) -> str:
+    """
+    Move a valid window datetime forward, without going past the most recent valid datetime (see get_valid_date).
+
+    Parameters
+    ----------
+        valid_datetime : str
+             A valid window datetime with format %Y-%m-%dT%H:%M:%SZ.
+        seconds : int
+             Seconds to move the window forward. Must be a multiple of 10.
+
+    Returns
+    -------
+        str
+        Datetime with format %Y-%m-%dT%H:%M:%SZ
+    """
+    latest = get_valid_date()
+    advanced = (datetime.datetime.strptime(valid_datetime, "%Y-%m-%dT%H:%M:%SZ")
+                + datetime.timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    # Both strings share the same format, so they can be compared lexicographically
+    return min(advanced, latest)
+
+
 def check_correct_response(response: requests.Response, live_stats_data: bool):
     """
     Check if the response from lolesport API is valid, and the format of the response is as expected.
@@ -37,7 +61,7 @@ def check_correct_response(response: requests.Response, live_stats_data: bool):
     Parameters
     ----------
         response : requests.Response
-             The response from the request on lolesport API.
+             The response from the request on lolesport API. Wrap it on a JsonResponse to decode the body only once.
         live_stats_data : bool
              No-live stats game include a dictionary with key "data".
     Returns
@@ -46,11 +70,72 @@ def check_correct_response(response: requests.Response, live_stats_data: bool):
     """
     if response.status_code != 200 and not (response.status_code == 204 and live_stats_data):
         raise LoLEsportResponseError(response.status_code)
-    if str(response.status_code)[0] == "4" and response.text and response.json().get('errors'):
+    if str(response.status_code)[0] == "4" and response.content and response.json().get('errors'):
         raise LoLEsportStructureError(errors_request=True)
-    if not live_stats_data and response.text and not response.json().get('data'):
+    if not live_stats_data and response.content and not response.json().get('data'):
         raise LoLEsportStructureError(errors_request=False)
 
 
 def unique_dicts(list_of_dicts: list, unique_key: str):
     return [list(grp)[0] for _, grp in itertools.groupby(list_of_dicts, lambda d: d[unique_key])]
+
+
+def iter_merged_window_details_frames(window_frames, details_frames, combine_participants: bool = False):
+    """Generator of merged frames (rfc460Timestamp, gameState, blue, red).
+
+    Details frames are indexed by rfc460Timestamp and joined with the window frame of the same timestamp,
+    replacing each window participant with the details participant of the same participantId. A window frame
+    without details frame keeps the window participants. Repeated timestamps are only merged once, keeping the
+    first frame. The input frames are not modified.
+
+        Parameters
+        ----------
+        window_frames : iterable
+            Frames of a window response. Can be any iterable, frames are merged as they are consumed.
+        details_frames : iterable
+            Frames of a details response.
+        combine_participants : bool (optional)
+            If True, each participant has the fields of both the window and the details participant (details
+            values first) instead of only the details ones, keeping the window only stats (totalGold,
+            currentHealth, maxHealth).
+
+        Yields
+         -------
+        dict
+    """
+    details_index = {}
+    for details_frame in details_frames:
+        details_index.setdefault(details_frame['rfc460Timestamp'], details_frame)
+
+    merged_timestamps = set()
+    for window_frame in window_frames:
+        timestamp = window_frame['rfc460Timestamp']
+        if timestamp in merged_timestamps:
+            continue
+        merged_timestamps.add(timestamp)
+
+        details_frame = details_index.get(timestamp)
+        if details_frame:
+            details_players = {player['participantId']: player for player in details_frame['participants']}
+        else:
+            details_players = {}
+            log.debug(f"Window frame without details frame. Timestamp: {timestamp}")
+
+        def merge_participant(player):
+            details_player = details_players.get(player['participantId'])
+            if details_player is None:
+                return player
+            return {**player, **details_player} if combine_participants else details_player
+
+        yield {
+            'rfc460Timestamp': timestamp,
+            'gameState': window_frame['gameState'],
+            'blue': {
+                **window_frame['blueTeam'],
+                'participants': [merge_participant(player) for player in window_frame['blueTeam']['participants']]
+            },
+            'red': {
+                **window_frame['redTeam'],
+                'participants': [merge_participant(player) for player in window_frame['redTeam']['participants']]
+            }
+        }
@@ -0,0 +1,228 @@
+import bisect
+import cProfile
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import json_backend
+
+log = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Cumulative histogram of observed values, in the Prometheus format."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        # Counts are stored per bucket, cumulated when exported
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> list:
+        counts, total = [], 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': {str(bound): count for bound, count in zip(self.buckets, self.cumulative_counts())}
+        }
+
+
+def labels_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def labels_text(labels: tuple, extra: tuple = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms identified by name and labels.
+
+    Usage
+    -----
+        with metrics.timer("triforce_phase_seconds", phase="fetch_teams"):
+            ...
+        metrics.increment("triforce_api_responses_total", endpoint="getTeams", status=200)
+
+        metrics.serve(9100)                             # Prometheus text on http://127.0.0.1:9100/metrics
+        metrics.start_json_dump("metrics.json", 60)     # or a JSON file rewritten every minute
+    """
+
+    def __init__(self, prefix: str = "triforce"):
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = labels_key(labels)
+        with self.lock:
+            counter = self.counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = labels_key(labels)
+        with self.lock:
+            self.histograms.setdefault(name, {}).setdefault(key, Histogram()).observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the seconds the block takes on the name histogram, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {
+                'counters': {name: [{'labels': dict(key), 'value': value} for key, value in values.items()]
+                             for name, values in self.counters.items()},
+                'histograms': {name: [{'labels': dict(key), **histogram.as_dict()}
+                                      for key, histogram in values.items()]
+                               for name, values in self.histograms.items()}
+            }
+
+    def prometheus_text(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for name, values in sorted(self.counters.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in values.items():
+                    lines.append(f"{metric}{labels_text(key)} {value}")
+
+            for name, values in sorted(self.histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in values.items():
+                    for bound, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                        lines.append(f"{metric}_bucket{labels_text(key, (('le', str(bound)),))} {count}")
+                    lines.append(f"{metric}_bucket{labels_text(key, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{metric}_sum{labels_text(key)} {histogram.sum}")
+                    lines.append(f"{metric}_count{labels_text(key)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json_backend.dumps({'time': time.time(), **self.as_dict()}, indent=True))
+
+    def start_json_dump(self, path: str, interval: float = 60) -> threading.Event:
+        """Rewrite the JSON dump every interval seconds on a daemon thread. Set the returned event to stop it."""
+        stop = threading.Event()
+
+        def dump_loop():
+            while not stop.wait(interval):
+                try:
+                    self.dump_json(path)
+                except Exception:
+                    log.exception(f"Error dumping metrics to {path}")
+            self.dump_json(path)
+
+        threading.Thread(target=dump_loop, name="metrics-json-dump", daemon=True).start()
+        return stop
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve the Prometheus text on /metrics (and the JSON on /metrics.json) from a daemon thread.
+        Only local clients can connect by default, pass host="0.0.0.0" to let a remote scraper reach it.
+        Call shutdown() on the returned server to stop it."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json_backend.dumps(registry.as_dict()).encode("utf-8"), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.debug(format % args)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        log.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+
+# Registry used by the API clients, the database and the updater
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def profile_run(output_prefix: str, cpu: bool = True, memory: bool = True, top: int = 30):
+    """Profile the block with cProfile and/or tracemalloc.
+
+    The cProfile stats are saved on {output_prefix}.prof (open them with pstats or snakeviz) and the top functions by
+    cumulative time on {output_prefix}_cpu.txt. The top allocation sites and the peak memory are saved on
+    {output_prefix}_memory.txt.
+
+    Usage
+    -----
+        with profile_run(f"{root_dir}/logs/update_profile"):
+            updater.update_triforce(api)
+    """
+    profiler = cProfile.Profile() if cpu else None
+    if memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(f"{output_prefix}.prof")
+            with open(f"{output_prefix}_cpu.txt", 'w', encoding='utf-8') as f:
+                pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(top)
+            log.info(f"CPU profile saved on {output_prefix}.prof")
+
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(f"{output_prefix}_memory.txt", 'w', encoding='utf-8') as f:
+                f.write(f"Current: {current / 2 ** 20:.2f} MiB, peak: {peak / 2 ** 20:.2f} MiB\n\n")
+                for stat in snapshot.statistics("lineno")[:top]:
+                    f.write(f"{stat}\n")
+            log.info(f"Memory profile saved on {output_prefix}_memory.txt (peak {peak / 2 ** 20:.2f} MiB)")
@@ -1,45 +1,133 @@
+import itertools
 import logging
+import threading
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from secrets import postgres
+from utils.metrics import metrics
 
 log = logging.getLogger(__name__)
 
 
+def copy_text_value(value) -> str:
+    """Format a value for COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class CopyRowsBuffer:
+    """Read-only file-like object that encodes rows to COPY text format as COPY reads them, so the rows are never
+    materialized as a single string."""
+
+    def __init__(self, rows, columns_count: int = None):
+        self.rows = iter(rows)
+        self.columns_count = columns_count
+        self.buffer = b""
+        self.rows_count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            if self.columns_count is not None and len(row) != self.columns_count:
+                raise ValueError(f"Missmatch of columns({self.columns_count}) and values {len(row)} "
+                                 f"on element number {self.rows_count} with values({row})")
+            self.rows_count += 1
+            self.buffer += ("\t".join([copy_text_value(value) for value in row]) + "\n").encode("utf-8")
+
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
 class Database:
 
-    def __init__(self, db_name: str):
+    def __init__(self, db_name: str, min_connections: int = 1, max_connections: int = 5):
         self.db_name = db_name
-        self.conn = None
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.pool = None
+        # Connection of the transaction in progress on each thread
+        self.local = threading.local()
 
     def open(self):
+        if self.pool and not self.pool.closed:
+            return
         try:
             # Connect to PostgreSQL server
             log.info(f'Connecting to the PostgreSQL database "{self.db_name}"')
-            self.conn = psycopg2.connect(database=self.db_name,
-                                         user=postgres['user'],
-                                         password=postgres['password'],
-                                         host=postgres['host'],
-                                         port=postgres['port'])
+            self.pool = ThreadedConnectionPool(self.min_connections,
+                                               self.max_connections,
+                                               database=self.db_name,
+                                               user=postgres['user'],
+                                               password=postgres['password'],
+                                               host=postgres['host'],
+                                               port=postgres['port'])
             log.info(f'Connection successful')
 
         except (Exception, psycopg2.DatabaseError) as error:
             log.exception(f"Can't connect to database")
+            raise
 
     def close(self):
-        if self.conn:
-            self.conn.commit()
-            self.conn.close()
+        if self.pool and not self.pool.closed:
+            self.pool.closeall()
+        self.pool = None
 
     def set_database(self, db_name: str):
+        self.close()
         self.db_name = db_name
 
+    @contextmanager
+    def transaction(self, independent: bool = False):
+        """Run every query of the block on the same pooled connection and transaction, committing when the block
+        ends or rolling back if it raises. A transaction inside another one on the same thread joins the outer one,
+        unless it's independent: it then runs on another pooled connection and is committed when its block ends
+        whatever the outer transaction does, e.g. for DDL that must not be rolled back with the outer transaction.
+
+        Usage
+        -----
+            with database.transaction():
+                database.query(...)
+                database.insert_rows(...)
+        """
+        outer_conn = getattr(self.local, "conn", None)
+        if outer_conn is not None and not independent:
+            yield outer_conn
+            return
+
+        self.open()
+        conn = self.pool.getconn()
+        self.local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.local.conn = outer_conn
+            self.pool.putconn(conn)
+
     def get(self, table: str, columns: list = None, limit=None):
         if not columns:
             columns = "*"
-        stmt = f"SELECT {columns} FROM {table};"
+        elif isinstance(columns, list):
+            columns = ", ".join(columns)
+        stmt = f"SELECT {columns} FROM {table}"
 
         if limit:
-            stmt += f"LIMIT {limit}"
+            stmt += f" LIMIT {limit}"
+        stmt += ";"
         result = self.query(stmt, None, True)
 
         return result
@@ -58,27 +146,118 @@ class Database:
 
     def insert_rows(self, table: str, columns: list, data_rows: list):
 
-        stmt = f"INSERT INTO {table} "
         if columns:
             for i, params_row in enumerate(data_rows):
                 if len(params_row) != len(columns):
                     raise ValueError(f"Missmatch of columns({len(columns)}) and values {len(params_row)} "
                                      f"on element number {i} with values({params_row})")
 
-            columns_to_string = ", ".join(columns)
-            stmt += f"({columns_to_string}) "
+        self.bulk_load(table, columns, data_rows)
+
+    def bulk_load(self, table: str, columns: list, rows, batch_size: int = 10000) -> int:
+        """Insert rows with COPY ... FROM STDIN, streaming them in batches of batch_size rows.
 
-        stmt += "VALUES " + ",".join([f"({', '.join(['%s ' for _ in row])})" for row in data_rows]) + ";"
+        rows can be any iterable (e.g. a generator), only one batch is kept in memory. If COPY fails for a batch
+        (e.g. a value without a valid text representation or a server/pooler not supporting COPY), the batch is
+        rolled back to a savepoint and inserted with execute_values, and the remaining batches use execute_values too.
 
-        self.query(stmt, [param for params_row in data_rows for param in params_row])
+            Parameters
+            ----------
+            table : str
+            columns : list
+                Column name of each row value. If None, rows must have a value for every table column.
+            rows : iterable
+                Rows as lists/tuples of values.
+            batch_size : int
+
+            Returns
+             -------
+            int
+                Number of inserted rows.
+        """
+        columns_sql = f" ({', '.join(columns)})" if columns else ""
+        columns_count = len(columns) if columns else None
+        rows = iter(rows)
+        use_copy = True
+        inserted_rows = 0
+
+        with self.transaction() as conn:
+            with conn.cursor() as curs:
+                for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+                    if use_copy:
+                        curs.execute("SAVEPOINT bulk_load;")
+                        try:
+                            with metrics.timer("db_statement_seconds", operation="COPY", table=table):
+                                curs.copy_expert(f"COPY {table}{columns_sql} FROM STDIN;",
+                                                 CopyRowsBuffer(batch, columns_count))
+                            curs.execute("RELEASE SAVEPOINT bulk_load;")
+                            inserted_rows += len(batch)
+                            continue
+                        except psycopg2.Error:
+                            log.warning(f"COPY into {table} failed, falling back to execute_values", exc_info=True)
+                            curs.execute("ROLLBACK TO SAVEPOINT bulk_load;")
+                            use_copy = False
+
+                    with metrics.timer("db_statement_seconds", operation="INSERT", table=table):
+                        execute_values(curs, f"INSERT INTO {table}{columns_sql} VALUES %s;", batch,
+                                       page_size=batch_size)
+                    inserted_rows += len(batch)
+
+        metrics.increment("db_rows_total", inserted_rows, operation="INSERT", table=table)
+
+        log.info(f"Loaded {inserted_rows} rows into {table}")
+        return inserted_rows
+
+    def upsert_rows(self, table: str, columns: list, data_rows: list, conflict_columns: list = None):
+        """Insert the rows, updating every column of the existing rows with the same conflict columns value(s).
+        The conflict columns must have a unique constraint."""
+
+        if not data_rows:
+            return
+        if not conflict_columns:
+            conflict_columns = ["ext_id"]
+
+        for i, params_row in enumerate(data_rows):
+            if len(params_row) != len(columns):
+                raise ValueError(f"Missmatch of columns({len(columns)}) and values {len(params_row)} "
+                                 f"on element number {i} with values({params_row})")
+
+        update_columns = [column for column in columns if column not in conflict_columns]
+
+        stmt = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+        stmt += f" ON CONFLICT ({', '.join(conflict_columns)}) "
+        if update_columns:
+            stmt += "DO UPDATE SET " + ", ".join([f"{column} = EXCLUDED.{column}" for column in update_columns]) + ";"
+        else:
+            stmt += "DO NOTHING;"
+
+        with self.transaction() as conn:
+            with conn.cursor() as curs:
+                with metrics.timer("db_statement_seconds", operation="UPSERT", table=table):
+                    execute_values(curs, stmt, data_rows, page_size=10000)
+        metrics.increment("db_rows_total", len(data_rows), operation="UPSERT", table=table)
+
+    def delete_rows(self, table: str, columns: list, keys: list):
+        """Delete the rows whose columns value(s) are in keys. With more than one column, each key is a list/tuple
+        with a value for each column."""
+
+        if not keys:
+            return
+
+        if len(columns) == 1:
+            stmt = f"DELETE FROM {table} WHERE {columns[0]} IN %s;"
+            params = [tuple(keys)]
+        else:
+            stmt = f"DELETE FROM {table} WHERE ({', '.join(columns)}) IN %s;"
+            params = [tuple(tuple(key) for key in keys)]
+
+        self.query(stmt, params)
 
     def query(self, stmt: str, params=None, fetch: bool = False):
-        self.open()
         # log.info(f"Statement : {stmt}")
-        with self.conn.cursor() as curs:
-            curs.execute(stmt, params)
-            if fetch:
-                result = curs.fetchall()
-        self.close()
-        if fetch:
-            return result
+        with self.transaction() as conn:
+            with conn.cursor() as curs:
+                with metrics.timer("db_statement_seconds", operation=stmt.split(None, 1)[0].upper()):
+                    curs.execute(stmt, params)
+                    if fetch:
+                        return curs.fetchall()
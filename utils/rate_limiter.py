@@ -0,0 +1,215 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket with an adaptive rate (AIMD): every throttled response halves the rate (down to
+    min_rate) and every successful one increases it by increase_step (up to max_rate)."""
+
+    def __init__(self, rate: float = 10, capacity: float = 10, min_rate: float = 0.5, max_rate: float = 50,
+                 increase_step: float = 0.1, decrease_factor: float = 0.5):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return the seconds to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttled(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        log.warning(f"Request throttled, rate reduced to {self.rate:.2f} requests/s")
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+
+class RetryPolicy:
+    """Which responses are retried and how long to wait before each retry: the Retry-After header if the response
+    has it, otherwise exponential backoff with full jitter."""
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1, max_delay: float = 60,
+                 retry_statuses: tuple = (403, 429, 500, 502, 503, 504), throttle_statuses: tuple = (403, 429)):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.throttle_statuses = throttle_statuses
+
+    @staticmethod
+    def retry_after(response) -> float:
+        """Seconds of the Retry-After header (as seconds or HTTP date), None if the response doesn't have it."""
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            retry_date = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_date.timestamp() - time.time()) if retry_date else None
+
+    def delay(self, attempt: int, response=None) -> float:
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class EndpointStats:
+    """Counters of the requests of an endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self.wait_seconds = 0.0
+        self.status_codes = {}
+
+    def as_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'wait_seconds': self.wait_seconds,
+            'status_codes': dict(self.status_codes)
+        }
+
+
+class RequestScheduler:
+    """Sends every request through a shared token bucket, retrying throttled (403/429), server error (5xx) and
+    connection error responses according to the retry policy. One scheduler can be shared by several clients
+    (sync and async) to share the rate limit.
+
+    Usage
+    -----
+        scheduler = RequestScheduler(TokenBucket(rate=5))
+        api = LoLEsportApi(scheduler=scheduler)
+        ...
+        scheduler.stats()
+    """
+
+    def __init__(self, bucket: TokenBucket = None, retry_policy: RetryPolicy = None):
+        self.bucket = bucket if bucket else TokenBucket()
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def endpoint_stats(self, endpoint: str) -> EndpointStats:
+        with self.lock:
+            return self.endpoints.setdefault(endpoint, EndpointStats())
+
+    def stats(self) -> dict:
+        """Counters by endpoint."""
+        with self.lock:
+            return {endpoint: stats.as_dict() for endpoint, stats in self.endpoints.items()}
+
+    def handle_result(self, stats: EndpointStats, attempt: int, response=None, error: Exception = None):
+        """Update the counters and the rate with a response (or connection error) and return the seconds to wait
+        before retrying it, or None if it must not be retried. Counters are updated under the lock, as the
+        scheduler is shared by threads."""
+        with self.lock:
+            if error is not None:
+                stats.errors += 1
+                retryable = True
+            else:
+                stats.status_codes[response.status_code] = stats.status_codes.get(response.status_code, 0) + 1
+                retryable = response.status_code in self.retry_policy.retry_statuses
+
+                if response.status_code in self.retry_policy.throttle_statuses:
+                    stats.throttled += 1
+                    self.bucket.throttled()
+                elif not retryable:
+                    self.bucket.succeeded()
+
+            if not retryable or attempt >= self.retry_policy.max_retries:
+                return None
+
+            stats.retries += 1
+            delay = self.retry_policy.delay(attempt, response)
+            stats.wait_seconds += delay
+
+        log.warning(f"Retrying request (attempt {attempt + 1}) in {delay:.2f}s. "
+                    f"{'Error: ' + str(error) if error is not None else 'Status code: ' + str(response.status_code)}")
+        return delay
+
+    def count_request(self, stats: EndpointStats, wait: float):
+        with self.lock:
+            stats.requests += 1
+            if wait > 0:
+                stats.wait_seconds += wait
+
+    def send(self, send, endpoint: str, retry_exceptions: tuple = ()):
+        """Call send() (a function doing the request and returning the response) respecting the rate limit and
+        retrying it if needed. Returns the last response, or raises the last error of retry_exceptions."""
+        stats = self.endpoint_stats(endpoint)
+
+        for attempt in range(self.retry_policy.max_retries + 1):
+            wait = self.bucket.reserve()
+            self.count_request(stats, wait)
+            if wait > 0:
+                time.sleep(wait)
+
+            try:
+                response = send()
+            except retry_exceptions as error:
+                delay = self.handle_result(stats, attempt, error=error)
+                if delay is None:
+                    raise
+            else:
+                delay = self.handle_result(stats, attempt, response=response)
+                if delay is None:
+                    return response
+                # Release the connection of the discarded response, e.g. of a stream request
+                response.close()
+            time.sleep(delay)
+
+    async def send_async(self, send, endpoint: str, retry_exceptions: tuple = ()):
+        """Coroutine version of send, send() must return an awaitable."""
+        stats = self.endpoint_stats(endpoint)
+
+        for attempt in range(self.retry_policy.max_retries + 1):
+            wait = self.bucket.reserve()
+            self.count_request(stats, wait)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            try:
+                response = await send()
+            except retry_exceptions as error:
+                delay = self.handle_result(stats, attempt, error=error)
+                if delay is None:
+                    raise
+            else:
+                delay = self.handle_result(stats, attempt, response=response)
+                if delay is None:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(delay)
@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+log = logging.getLogger(__name__)
+
+# Seconds a response is fresh, by endpoint name (last path segment of the API, or "window"/"details" for the
+# live stats API). Endpoints not listed use the default ttl of the cache.
+DEFAULT_TTLS = {
+    'getLeagues': 6 * 3600,
+    'getTournamentsForLeague': 6 * 3600,
+    'getTeams': 3600,
+    'getStandings': 600,
+    'getCompletedEvents': 600,
+    'getSchedule': 300,
+    'getEventDetails': 300,
+    'getGames': 300,
+    'getLive': 10,
+    'window': 10,
+    'details': 10
+}
+
+
+def endpoint_name(url: str) -> str:
+    """Endpoint of an API url, e.g. "getLeagues" or "window" for .../livestats/v1/window/{game_id}."""
+    segments = url.rstrip("/").split("/")
+    if len(segments) > 1 and segments[-2] in ("window", "details"):
+        return segments[-2]
+    return segments[-1]
+
+
+class CachedResponse:
+    """Content and validators (ETag, Last-Modified) of a cached response."""
+
+    def __init__(self, url: str, status_code: int, content: bytes, headers: dict, expires_at: float):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+        self.headers = {key: value for key, value in headers.items()
+                        if key.lower() in ('content-type', 'etag', 'last-modified')}
+        self.expires_at = expires_at
+
+    def to_response(self) -> requests.Response:
+        """Build a new requests.Response from the cached content, so callers never share parsed objects."""
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = self.status_code
+        response._content = self.content
+        response.headers.update(self.headers)
+        response.encoding = 'utf-8'
+        return response
+
+
+class DiskCacheBackend:
+    """Stores cached responses as pickle files on a directory, keeping at most max_entries files (the least
+    recently written are removed first)."""
+
+    def __init__(self, directory: str, max_entries: int = 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".cache")
+
+    def get(self, key: str):
+        try:
+            with open(self.path(key), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            log.exception(f"Unexpected error loading cached response {key}")
+            return None
+
+    def set(self, key: str, entry: CachedResponse):
+        try:
+            with open(self.path(key), 'wb') as f:
+                pickle.dump(entry, f)
+        except Exception:
+            log.exception(f"Unexpected error saving cached response {key}")
+        self.evict()
+
+    def evict(self):
+        files = [os.path.join(self.directory, file) for file in os.listdir(self.directory) if file.endswith(".cache")]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for file in files[:len(files) - self.max_entries]:
+            os.remove(file)
+
+
+class ResponseCache:
+    """In-memory LRU cache of API responses keyed by url and params, with a ttl per endpoint, an optional disk
+    backend and revalidation of expired responses with If-None-Match/If-Modified-Since when the server sent
+    ETag/Last-Modified.
+
+    Usage
+    -----
+        api = LoLEsportApi(cache=ResponseCache(disk_backend=DiskCacheBackend(f"{root_dir}/cache")))
+    """
+
+    def __init__(self, ttls: dict = None, default_ttl: float = 60, max_entries: int = 256,
+                 disk_backend: DiskCacheBackend = None):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.disk_backend = disk_backend
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(url: str, params: dict) -> str:
+        params = sorted((name, str(value)) for name, value in (params or {}).items() if value is not None)
+        return url + "?" + "&".join(f"{name}={value}" for name, value in params)
+
+    def ttl(self, url: str) -> float:
+        return self.ttls.get(endpoint_name(url), self.default_ttl)
+
+    def get_entry(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                return entry
+
+        if self.disk_backend:
+            entry = self.disk_backend.get(key)
+            if entry:
+                self.set_entry(key, entry, write_disk=False)
+        return entry
+
+    def set_entry(self, key: str, entry: CachedResponse, write_disk: bool = True):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+        if self.disk_backend and write_disk:
+            self.disk_backend.set(key, entry)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def fetch(self, send, url: str, params: dict = None) -> requests.Response:
+        """Return the cached response of the request if it's fresh, otherwise request it with send(url, params,
+        headers) (as a conditional request if possible) and cache the result. Only 200 and 204 responses are
+        cached."""
+        key = self.key(url, params)
+        ttl = self.ttl(url)
+        entry = self.get_entry(key) if ttl > 0 else None
+        now = time.time()
+
+        if entry and entry.expires_at > now:
+            self.hits += 1
+            return entry.to_response()
+
+        headers = {}
+        if entry and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+        response = send(url, params, headers)
+
+        if response.status_code == 304 and entry:
+            self.revalidations += 1
+            entry.expires_at = now + ttl
+            self.set_entry(key, entry)
+            return entry.to_response()
+
+        self.misses += 1
+        if ttl > 0 and response.status_code in (200, 204):
+            self.set_entry(key, CachedResponse(response.url, response.status_code, response.content,
+                                               response.headers, now + ttl))
+        return response
@@ -0,0 +1,132 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class Stage:
+    """A unit of work of a StageScheduler: function is called with the results of the depends_on stages (in the
+    same order) as positional arguments."""
+
+    def __init__(self, name: str, function, depends_on: tuple = (), on_caller_thread: bool = False):
+        self.name = name
+        self.function = function
+        self.depends_on = tuple(depends_on)
+        # Stages that must run on the thread calling run, e.g. the ones using its database transaction
+        self.on_caller_thread = on_caller_thread
+
+
+class StageScheduler:
+    """Runs a DAG of stages, each one as soon as all the stages it depends on are finished.
+
+    Stages run on a thread pool, so independent stages (e.g. API requests) overlap. Stages added with
+    on_caller_thread run one at a time on the thread calling run, as soon as they're ready, while the pool keeps
+    running the others. If a stage raises, no new stage is started and run raises the error once the running ones
+    finish.
+
+    Usage
+    -----
+        scheduler = StageScheduler(max_workers=4)
+        scheduler.add("leagues", api.get_leagues)
+        scheduler.add("leagues_sql", triforce_utils.leagues_to_sql, depends_on=["leagues"])
+        scheduler.add("load_leagues", update_leagues_table, depends_on=["leagues_sql"], on_caller_thread=True)
+        results = scheduler.run()
+    """
+
+    def __init__(self, max_workers: int = 4, metric: str = None):
+        self.max_workers = max_workers
+        # Histogram the duration of each stage is observed on, labeled by stage name
+        self.metric = metric
+        self.stages = {}
+
+    def add(self, name: str, function, depends_on: list = (), on_caller_thread: bool = False):
+        if name in self.stages:
+            raise ValueError(f"Stage {name} already added")
+        self.stages[name] = Stage(name, function, depends_on, on_caller_thread)
+
+    def check(self):
+        """Raise ValueError if a stage depends on an unknown stage or there is a dependency cycle."""
+        for stage in self.stages.values():
+            unknown = [name for name in stage.depends_on if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages {unknown}")
+
+        visited, in_path = set(), set()
+
+        def visit(name):
+            if name in in_path:
+                raise ValueError(f"Dependency cycle on stage {name}")
+            if name in visited:
+                return
+            in_path.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            in_path.remove(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def run_stage(self, stage: Stage, results: dict):
+        arguments = [results[name] for name in stage.depends_on]
+        log.debug(f"Starting stage {stage.name}")
+        if self.metric:
+            with metrics.timer(self.metric, phase=stage.name):
+                return stage.function(*arguments)
+        return stage.function(*arguments)
+
+    def run(self) -> dict:
+        """Run every stage and return their results by stage name."""
+        self.check()
+
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        error = None
+
+        def ready_stages():
+            return [stage for stage in pending.values()
+                    if all(name in results for name in stage.depends_on)]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if error is None:
+                    ready = ready_stages()
+                    for stage in ready:
+                        if not stage.on_caller_thread:
+                            del pending[stage.name]
+                            running[executor.submit(self.run_stage, stage, results)] = stage
+
+                    caller_stage = next((stage for stage in ready if stage.on_caller_thread), None)
+                    if caller_stage:
+                        del pending[caller_stage.name]
+                        try:
+                            results[caller_stage.name] = self.run_stage(caller_stage, results)
+                        except Exception as stage_error:
+                            log.error(f"Stage {caller_stage.name} failed")
+                            error = stage_error
+                        continue
+                elif not running:
+                    break
+
+                if not running:
+                    if pending:
+                        # Only possible with unmet dependencies, which check prevents
+                        raise RuntimeError(f"Stages {list(pending)} can't run")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        results[stage.name] = future.result()
+                    except Exception as stage_error:
+                        log.error(f"Stage {stage.name} failed")
+                        if error is None:
+                            error = stage_error
+
+        if error is not None:
+            raise error
+        return results
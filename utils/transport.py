@@ -0,0 +1,226 @@
+import asyncio
+import base64
+import io
+import logging
+import os
+import threading
+import time
+
+import httpx
+import requests
+
+from utils import json_backend
+from utils.response_cache import ResponseCache
+
+log = logging.getLogger(__name__)
+
+# Headers not recorded: the recorded content is already decoded and its length may change on replay
+SKIPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'set-cookie', 'connection')
+
+
+class RecordStore:
+    """JSONL file of recorded request/response pairs, one per line, with an in-memory index of the offset of each
+    line by request key (url and params, see ResponseCache.key). Request headers (the API key) are never recorded.
+
+    A request recorded several times (e.g. the live stats windows) is replayed in the recorded order, and its last
+    response is repeated once they are exhausted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index = {}
+        self.served = {}
+        self.load_index()
+
+    def load_index(self):
+        self.index = {}
+        self.served = {}
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    self.index.setdefault(json_backend.loads(line)['key'], []).append(offset)
+                offset += len(line)
+        log.info(f"Loaded {sum(len(offsets) for offsets in self.index.values())} recorded requests from {self.path}")
+
+    def record(self, url: str, params: dict, status_code: int, headers: dict, content: bytes, elapsed: float):
+        key = ResponseCache.key(url, params)
+        try:
+            text, encoding = content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        entry = {
+            'key': key,
+            'url': url,
+            'params': {name: str(value) for name, value in (params or {}).items() if value is not None},
+            'status_code': status_code,
+            'headers': {name: value for name, value in headers.items() if name.lower() not in SKIPPED_HEADERS},
+            'elapsed': elapsed,
+            'encoding': encoding,
+            'content': text
+        }
+        line = (json_backend.dumps(entry) + "\n").encode("utf-8")
+
+        with self.lock:
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+            self.index.setdefault(key, []).append(offset)
+
+    def get(self, url: str, params: dict):
+        """Next recorded entry of the request, None if it wasn't recorded."""
+        key = ResponseCache.key(url, params)
+        with self.lock:
+            offsets = self.index.get(key)
+            if not offsets:
+                return None
+            served = self.served.get(key, 0)
+            self.served[key] = served + 1
+            offset = offsets[min(served, len(offsets) - 1)]
+
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            entry = json_backend.loads(f.readline())
+
+        content = entry['content'].encode("utf-8")
+        entry['content'] = base64.b64decode(content) if entry['encoding'] == "base64" else content
+        return entry
+
+    def rewind(self):
+        """Serve every request from its first recorded response again."""
+        with self.lock:
+            self.served = {}
+
+
+def replay_delay(entry: dict, latency) -> float:
+    """Seconds to wait before serving an entry: latency seconds, the recorded elapsed time if latency is
+    "recorded", or nothing if latency is None."""
+    if latency is None:
+        return 0
+    if latency == "recorded":
+        return entry['elapsed']
+    return float(latency)
+
+
+class RecordingSession:
+    """requests.Session replacement that sends the requests with a real session and records every response on the
+    store.
+
+    Usage
+    -----
+        api = LoLEsportApi(session=RecordingSession(RecordStore(f"{root_dir}/recorded_requests.jsonl")))
+    """
+
+    def __init__(self, store: RecordStore, session: requests.Session = None):
+        self.store = store
+        self.session = session if session else requests.Session()
+        self.headers = self.session.headers
+
+    def get(self, url, params=None, headers=None, stream=False, **kwargs) -> requests.Response:
+        # The body is always downloaded to record it, stream readers get it from raw
+        response = self.session.get(url, params=params, headers=headers, **kwargs)
+        self.store.record(url, params, response.status_code, response.headers, response.content,
+                          response.elapsed.total_seconds())
+        response.raw = io.BytesIO(response.content)
+
+        return response
+
+
+class ReplaySession:
+    """requests.Session replacement that answers from the recorded responses of the store, without network.
+    Requests that weren't recorded get a 404 response.
+
+    Usage
+    -----
+        api = LoLEsportApi(session=ReplaySession(RecordStore(f"{root_dir}/recorded_requests.jsonl"),
+                                                 latency="recorded"))
+    """
+
+    def __init__(self, store: RecordStore, latency=None):
+        self.store = store
+        # None, "recorded" or fixed seconds, see replay_delay
+        self.latency = latency
+        self.headers = requests.structures.CaseInsensitiveDict()
+
+    def get(self, url, params=None, headers=None, stream=False, **kwargs) -> requests.Response:
+        entry = self.store.get(url, params)
+
+        response = requests.Response()
+        response.url = url
+        response.encoding = 'utf-8'
+        if entry is None:
+            log.warning(f"Request not recorded: {ResponseCache.key(url, params)}")
+            response.status_code = 404
+            response._content = b""
+        else:
+            time.sleep(replay_delay(entry, self.latency))
+            response.status_code = entry['status_code']
+            response.headers.update(entry['headers'])
+            response._content = entry['content']
+        response.raw = io.BytesIO(response._content)
+
+        return response
+
+
+def httpx_request_url(request: httpx.Request) -> tuple:
+    """(url without query, params) of a httpx request."""
+    return str(request.url.copy_with(query=None)), dict(request.url.params)
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    """httpx transport that sends the requests with a real transport and records every response on the store.
+
+    Usage
+    -----
+        api = AsyncLoLEsportApi(transport=AsyncRecordingTransport(RecordStore(f"{root_dir}/recorded_requests.jsonl")))
+    """
+
+    def __init__(self, store: RecordStore, transport: httpx.AsyncBaseTransport = None):
+        self.store = store
+        self.transport = transport if transport else httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        content = await response.aread()
+        elapsed = time.monotonic() - start
+        await response.aclose()
+
+        # Content is already decoded, so the response is rebuilt without the encoding headers
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in SKIPPED_HEADERS}
+        url, params = httpx_request_url(request)
+        self.store.record(url, params, response.status_code, headers, content, elapsed)
+
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport):
+    """httpx transport that answers from the recorded responses of the store, see ReplaySession.
+
+    Usage
+    -----
+        api = AsyncLoLEsportApi(transport=AsyncReplayTransport(RecordStore(f"{root_dir}/recorded_requests.jsonl")))
+    """
+
+    def __init__(self, store: RecordStore, latency=None):
+        self.store = store
+        self.latency = latency
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url, params = httpx_request_url(request)
+        entry = self.store.get(url, params)
+
+        if entry is None:
+            log.warning(f"Request not recorded: {ResponseCache.key(url, params)}")
+            return httpx.Response(404, content=b"", request=request)
+
+        await asyncio.sleep(replay_delay(entry, self.latency))
+        return httpx.Response(entry['status_code'], headers=entry['headers'], content=entry['content'],
+                              request=request)